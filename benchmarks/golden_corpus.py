@@ -0,0 +1,51 @@
+"""Checks that the postprocessing still gives the own_text and cleaned_text
+columns of the checked-in postprocessed CSVs:
+
+    python -m benchmarks.golden_corpus --sample 5000
+
+Exits with 1 when some rows differ. The checked-in CSVs were made with a
+given fr_core_news_md version, so run it with the same model.
+"""
+import argparse
+import sys
+from typing import Optional
+
+import pandas as pd
+
+from tweet_postprocesser.csv_io import read_postprocessed_csvs
+from tweet_postprocesser.postprocessing import (clean_tweet_texts,
+                                                get_own_text_column)
+
+
+def load_golden_corpus(sample: Optional[int] = None,
+                       seed: int = 0) -> pd.DataFrame:
+    df = pd.concat(read_postprocessed_csvs(backend='csv').values(),
+                   ignore_index=True)
+    if sample and sample < len(df):
+        df = df.sample(n=sample, random_state=seed).reset_index(drop=True)
+    return df
+
+
+def check_golden_corpus(sample: Optional[int] = None,
+                        max_printed: int = 20) -> int:
+    """Returns the number of rows that differ"""
+    df = load_golden_corpus(sample)
+    own_text = get_own_text_column(df).fillna('')
+    cleaned_text = pd.Series(clean_tweet_texts(own_text), index=df.index)
+
+    differs = ((own_text != df['own_text'].fillna(''))
+               | (cleaned_text != df['cleaned_text'].fillna('')))
+    for i in differs[differs].index[:max_printed]:
+        print(f"tweet {df.at[i, 'id']}:\n"
+              f"  expected: {df.at[i, 'cleaned_text']!r}\n"
+              f"  got:      {cleaned_text[i]!r}")
+    print(f'{differs.sum()} / {len(df)} rows differ from the golden corpus')
+    return int(differs.sum())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sample', type=int,
+                        help='number of random rows to check (default: all)')
+    args = parser.parse_args()
+    sys.exit(1 if check_golden_corpus(args.sample) else 0)
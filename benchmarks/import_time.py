@@ -0,0 +1,94 @@
+"""Import time of the modules, each one measured in a fresh interpreter.
+Fails if a module takes longer than its budget or imports a heavy module it
+should only load on first use (spaCy model, pandas, network calls...):
+
+    python -m benchmarks.import_time --output import_time.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+# module: (budget in ms, modules it must not import)
+IMPORT_BUDGETS = {
+    'tweet_scrapper.dates': (300, ['pandas', 'tweepy', 'spacy']),
+    'tweet_scrapper.constants': (300, ['pandas', 'tweepy', 'spacy']),
+    'tweet_scrapper.create_csvs': (2000, ['spacy']),
+    'tweet_postprocesser.csv_io': (1500, ['spacy', 'tweepy']),
+    'tweet_postprocesser.postprocessing': (2500, ['spacy']),
+}
+
+_IMPORT_SCRIPT = '''
+import json, sys, time
+start_time = time.perf_counter()
+import {module}
+import_ms = 1000 * (time.perf_counter() - start_time)
+print(json.dumps({{'import_ms': import_ms, 'modules': sorted(sys.modules)}}))
+'''
+
+
+def measure_import(module: str) -> Dict:
+    # any API call at import time fails instead of reaching the network
+    with tempfile.TemporaryDirectory() as empty_fixtures_dir:
+        env = dict(os.environ,
+                   TWEETS_TRANSPORT='replay',
+                   TWEETS_FIXTURES_DIR=empty_fixtures_dir)
+        start_time = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-c', _IMPORT_SCRIPT.format(module=module)],
+            capture_output=True, text=True, env=env)
+        total_ms = 1000 * (time.perf_counter() - start_time)
+    if process.returncode:
+        return {'module': module, 'error': process.stderr.strip()}
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    return {'module': module,
+            'import_ms': result['import_ms'],
+            'process_ms': total_ms,
+            'modules': result['modules']}
+
+
+def run_benchmark(budget_scale: float = 1.,
+                  output: Optional[str] = None) -> List[str]:
+    """Returns the regressions"""
+    results, regressions = [], []
+    for module, (budget_ms, forbidden_modules) in IMPORT_BUDGETS.items():
+        result = measure_import(module)
+        if 'error' in result:
+            regressions.append(f'{module} failed to import: '
+                               f"{result['error']}")
+            results.append(result)
+            continue
+        imported = set(result.pop('modules'))
+        result['forbidden_imports'] = sorted(
+            forbidden for forbidden in forbidden_modules
+            if forbidden in imported)
+        result['budget_ms'] = budget_ms * budget_scale
+        print(f"{module}: {round(result['import_ms'])} ms "
+              f"(budget {round(result['budget_ms'])} ms)")
+        if result['import_ms'] > result['budget_ms']:
+            regressions.append(f'{module} imports in '
+                               f"{round(result['import_ms'])} ms")
+        if result['forbidden_imports']:
+            regressions.append(f'{module} imports '
+                               f"{result['forbidden_imports']}")
+        results.append(result)
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--budget-scale', type=float, default=1.,
+                        help='multiplies the budgets, for slower machines')
+    parser.add_argument('--output', help='JSON report path')
+    args = parser.parse_args()
+    regressions = run_benchmark(args.budget_scale, args.output)
+    for regression in regressions:
+        print(f'REGRESSION - {regression}')
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,203 @@
+"""Per-stage throughput of the postprocessing, on synthetic French tweets or
+on a sample of the checked-in scrapped CSVs:
+
+    python -m benchmarks.postprocessing --size 20000 --output report.json
+    python -m benchmarks.postprocessing --size 20000 --from-csvs
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+from tweet_postprocesser import postprocessing
+from tweet_postprocesser.csv_io import read_scrapped_csvs
+from tweet_postprocesser.real_words import RealWordsCache
+from tweet_scrapper.constants import TWEET_CSV_HEADER
+from tweet_scrapper.parse_tweet import TweetType
+
+WORDS = [
+    'france', 'république', 'élection', 'présidentielle', 'campagne',
+    'programme', 'pouvoir', "d'achat", 'retraites', 'écologie', 'santé',
+    'école', 'travail', 'salaires', 'énergie', 'nucléaire', 'europe',
+    'sécurité', 'justice', 'jeunesse', 'agriculteurs', 'impôts', 'débat',
+    'meeting', 'votez', 'dimanche', 'ensemble', 'avenir', 'liberté',
+    'le', 'la', 'les', 'de', 'des', 'et', 'pour', 'avec', 'nous', 'vous',
+    'est', 'une', 'un', 'à', 'dans', 'sur', 'pas', 'plus', 'ce', 'qui',
+]
+HASHTAGS = ['#Presidentielle2022', '#Macron20h', '#écologie', '#retraites',
+            '#JeVoteMacron', '#MLP2022', '#Zemmour', '#LaFranceInsoumise',
+            '#débat', '#santé', '#8mars', '#Ukraine']
+USERNAMES = ['@EmmanuelMacron', '@MLP_officiel', '@JLMelenchon',
+             '@vpecresse', '@ZemmourEric', '@yjadot', '@Anne_Hidalgo']
+EMOJIS = ['🇫🇷', '👉', '🔴', '🟢', '💯', '😀', '🚀', '©', '✅', '➡️']
+ENTITIES = ['&amp;', '&gt;', '&lt;']
+PUNCTUATION = ['.', ',', '!', '?', '...', ':', '«', '»', '(', ')', '[…]']
+
+
+def _random_url(rng: random.Random) -> str:
+    return 'https://t.co/' + ''.join(
+        rng.choice('abcdefghijklmnopqrstuvwxyzABCDEFGHIJ0123456789')
+        for _ in range(10))
+
+
+def _random_sentence(rng: random.Random) -> str:
+    parts = []
+    for _ in range(rng.randint(6, 35)):
+        draw = rng.random()
+        if draw < 0.06:
+            parts.append(rng.choice(HASHTAGS))
+        elif draw < 0.09:
+            parts.append(rng.choice(USERNAMES))
+        elif draw < 0.13:
+            parts.append(rng.choice(EMOJIS))
+        elif draw < 0.15:
+            parts.append(rng.choice(ENTITIES))
+        elif draw < 0.25:
+            parts.append(rng.choice(PUNCTUATION))
+        else:
+            parts.append(rng.choice(WORDS))
+    if rng.random() < 0.4:
+        parts.append(_random_url(rng))
+    return ' '.join(parts)
+
+
+def generate_synthetic_tweets(size: int, seed: int = 0) -> pd.DataFrame:
+    """Normal tweets, replies, quotes and retweets in the scrapped schema"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(size):
+        tweet_type = rng.choices(list(TweetType), weights=[5, 2, 2, 3])[0]
+        text = _random_sentence(rng)
+        if tweet_type == TweetType.REPLY:
+            text = ' '.join(rng.sample(USERNAMES, rng.randint(1, 3))
+                            + [text])
+        elif tweet_type == TweetType.QUOTING:
+            text = f'{text} {_random_url(rng)}'
+        elif tweet_type == TweetType.RETWEET:
+            text = f'RT {rng.choice(USERNAMES)}: {text}'
+        has_reference = tweet_type != TweetType.NORMAL
+        rows.append({
+            'username': 'synthetic',
+            'id': str(1_500_000_000_000_000_000 - i),
+            'datetime': '2022-04-08 11:08:46+00:00',
+            'type': tweet_type.value,
+            'text': text,
+            'has_referenced_tweet': has_reference,
+            'referenced_tweet_found': has_reference,
+            'referenced_tweet_id': str(1_400_000_000_000_000_000 - i)
+            if has_reference else '',
+            'referenced_tweet_text': _random_sentence(rng)
+            if has_reference else '',
+            'referenced_tweet_datetime': '2022-04-08 10:00:00+00:00'
+            if has_reference else '',
+            'referenced_tweet_author_id': '42' if has_reference else '',
+            'referenced_tweet_author_name': 'Auteur' if has_reference else '',
+            'referenced_tweet_author_username': 'auteur'
+            if has_reference else '',
+        })
+    return pd.DataFrame(rows, columns=TWEET_CSV_HEADER)
+
+
+def sample_scrapped_tweets(size: int, seed: int = 0) -> pd.DataFrame:
+    df = pd.concat(read_scrapped_csvs().values(), ignore_index=True)
+    return df.sample(n=min(size, len(df)), random_state=seed,
+                     ).reset_index(drop=True)
+
+
+def _timed(stages: Dict[str, float], name: str, function: Callable, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    stages[name] = time.perf_counter() - start_time
+    return result
+
+
+def run_benchmark(df: pd.DataFrame,
+                  batch_size: int = postprocessing.DEFAULT_BATCH_SIZE
+                  ) -> Dict:
+    # cold hashtag classification, without touching data/real_words.json
+    real_words_cache = postprocessing.REAL_WORDS_CACHE
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        postprocessing.REAL_WORDS_CACHE = RealWordsCache(
+            os.path.join(tmp_dir, 'real_words.json'))
+        try:
+            return _run_benchmark(df, batch_size, tmp_dir)
+        finally:
+            postprocessing.REAL_WORDS_CACHE = real_words_cache
+
+
+def _run_benchmark(df: pd.DataFrame, batch_size: int, tmp_dir: str) -> Dict:
+    _timed({}, 'load_model', postprocessing.get_nlp)
+
+    stages: Dict[str, float] = {}
+    own_texts = _timed(stages, 'get_own_text',
+                       postprocessing.get_own_text_column, df).tolist()
+    texts = _timed(stages, 'strip_emojis_urls_usernames', lambda: [
+        postprocessing._remove_usernames(postprocessing._remove_urls(
+            postprocessing._remove_emojis(text))).lower()
+        for text in own_texts])
+    texts = _timed(stages, 'hashtag_classification', lambda: [
+        postprocessing._remove_pure_hashtags(text) for text in texts])
+    texts = _timed(stages, 'html_unescape', lambda: [
+        postprocessing._unescape_html(text) for text in texts])
+
+    nlp = postprocessing.get_nlp()
+    disabled_pipes = [pipe for pipe in postprocessing.UNUSED_PIPES
+                      if pipe in nlp.pipe_names]
+    docs = _timed(stages, 'spacy_tokenisation', lambda: list(
+        nlp.pipe(texts, batch_size=batch_size, disable=disabled_pipes)))
+    cleaned_texts = _timed(stages, 'token_filtering', lambda: [
+        postprocessing._join_cleaned_tokens(doc) for doc in docs])
+
+    df = df.assign(own_text=own_texts, cleaned_text=cleaned_texts)
+    csv_path = os.path.join(tmp_dir, 'postprocessed.csv')
+    _timed(stages, 'csv_write', lambda: df.to_csv(
+        csv_path, index=False, quoting=csv.QUOTE_NONNUMERIC))
+    csv_bytes = os.path.getsize(csv_path)
+
+    total_seconds = sum(stages.values())
+    return {
+        'n_tweets': len(df),
+        'total_seconds': total_seconds,
+        'tweets_per_second': len(df) / total_seconds,
+        'csv_bytes': csv_bytes,
+        'real_words_cache': postprocessing.REAL_WORDS_CACHE.stats(),
+        'stages': {name: {'seconds': seconds,
+                          'tweets_per_second': len(df) / seconds
+                          if seconds else None}
+                   for name, seconds in stages.items()},
+    }
+
+
+def main(size: int, from_csvs: bool = False, seed: int = 0,
+         output: Optional[str] = None) -> Dict:
+    if from_csvs:
+        df = sample_scrapped_tweets(size, seed)
+    else:
+        df = generate_synthetic_tweets(size, seed)
+    report = run_benchmark(df)
+    report['corpus'] = 'checked-in CSVs' if from_csvs else 'synthetic'
+    for name, stage in report['stages'].items():
+        print(f"{name}: {round(stage['seconds'], 3)} s")
+    print(f"{report['n_tweets']} tweets: "
+          f"{round(report['tweets_per_second'], 1)} tweets/s")
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=10_000)
+    parser.add_argument('--from-csvs', action='store_true',
+                        help='sample the checked-in scrapped CSVs')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON report path')
+    args = parser.parse_args()
+    main(args.size, args.from_csvs, args.seed, args.output)
@@ -0,0 +1,116 @@
+"""Throughput of update_candidate_csv end to end (pagination, parsing,
+staging, journal, commit and watermark) on synthetic timelines, without
+network nor bearer token:
+
+    python -m benchmarks.scrapper --sizes 1000 100000 1000000 \
+        --output scrapper_benchmark.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from tweet_scrapper import create_csvs, user_tweets
+from tweet_scrapper.activity import ActivityStore
+from tweet_scrapper.metrics import METRICS
+from tweet_scrapper.rate_limit import TokenBucket
+from tweet_scrapper.reference_cache import ReferenceCache
+from tweet_scrapper.transport import SyntheticClient
+from tweet_scrapper.watermarks import WatermarkStore
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+USERNAME = 'benchmark'
+
+
+@contextmanager
+def _scraping_in(tmp_dir: str) -> Iterator[str]:
+    """update_candidate_csv writing its CSV, watermarks, journal and caches
+    in `tmp_dir` instead of data/. Yields the CSV path."""
+    csv_path = os.path.join(tmp_dir, f'{USERNAME}.csv')
+    replaced = {
+        (create_csvs, 'ACCOUNTS_TWEET_CSVS'): {USERNAME: csv_path},
+        (create_csvs, 'WATERMARKS'): WatermarkStore(
+            os.path.join(tmp_dir, 'watermarks.json')),
+        (create_csvs, 'ACTIVITY'): ActivityStore(
+            os.path.join(tmp_dir, 'activity.json')),
+        (create_csvs, 'REFERENCE_CACHE'): ReferenceCache(
+            os.path.join(tmp_dir, 'reference_cache.sqlite')),
+        (user_tweets, 'USER_IDS_FILE'): os.path.join(tmp_dir,
+                                                     'user_ids.json'),
+    }
+    originals = {key: getattr(*key) for key in replaced}
+    for (module, name), value in replaced.items():
+        setattr(module, name, value)
+    try:
+        yield csv_path
+    finally:
+        create_csvs.REFERENCE_CACHE.close()
+        for (module, name), value in originals.items():
+            setattr(module, name, value)
+
+
+def _stage_seconds() -> Dict[str, float]:
+    return {metric['name']: metric['sum'] for metric in METRICS.snapshot()
+            if metric['name'].endswith('_seconds')
+            and not metric['labels'].get('endpoint')}
+
+
+def _api_pages() -> int:
+    # timeline pages only: client.requests_count also counts get_users
+    return sum(metric['value'] for metric in METRICS.snapshot()
+               if metric['name'] == 'api_pages')
+
+
+def run_benchmark(n_tweets: int) -> Dict[str, float]:
+    client = SyntheticClient(n_tweets=n_tweets)
+    METRICS.reset()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with _scraping_in(tmp_dir) as csv_path:
+            start_time = time.perf_counter()
+            create_csvs.update_candidate_csv(USERNAME, client=client)
+            update_seconds = time.perf_counter() - start_time
+            csv_bytes = os.path.getsize(csv_path)
+    pages = _api_pages()
+
+    return {
+        'n_tweets': n_tweets,
+        'pages': pages,
+        'requests': client.requests_count,
+        'update_seconds': update_seconds,
+        'pages_per_second': pages / update_seconds,
+        'tweets_per_second': n_tweets / update_seconds,
+        'csv_bytes': csv_bytes,
+        # parse_page, csv_stage, csv_commit...
+        **_stage_seconds(),
+    }
+
+
+def run_benchmarks(sizes: List[int],
+                   output: Optional[str] = None) -> List[Dict[str, float]]:
+    # the synthetic API has no quota
+    user_tweets.USER_TWEETS_RATE_LIMITER = TokenBucket(capacity=10 ** 9,
+                                                       period=1)
+    results = []
+    for n_tweets in sizes:
+        result = run_benchmark(n_tweets)
+        print(f"{n_tweets} tweets: "
+              f"{round(result['pages_per_second'], 1)} pages/s, "
+              f"{round(result['tweets_per_second'], 1)} tweets/s, "
+              f"CSV committed in "
+              f"{round(result.get('csv_commit_seconds', 0.), 2)} s")
+        results.append(result)
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--output', help='JSON report path')
+    args = parser.parse_args()
+    run_benchmarks(args.sizes, args.output)
@@ -1,6 +1,39 @@
-from tweet_scrapper.create_csvs import do_update as update_scrapped_tweets_csvs
+import argparse
+
+from tweet_postprocesser.pipeline import (DEFAULT_POSTPROCESSING_WORKERS,
+                                          DEFAULT_QUEUE_SIZE, run_pipeline)
 from tweet_postprocesser.postprocessing import do_post_processing
+from tweet_scrapper.create_csvs import DEFAULT_MAX_WORKERS
+from tweet_scrapper.create_csvs import do_update as update_scrapped_tweets_csvs
 
 if __name__ == '__main__':
-    update_scrapped_tweets_csvs()
-    do_post_processing()
+    parser = argparse.ArgumentParser(
+        description='Scraps the new tweets of the candidates and '
+                    'postprocesses them')
+    parser.add_argument('--sequential', action='store_true',
+                        help='scrap every candidate before postprocessing')
+    parser.add_argument('--scraping-workers', type=int,
+                        default=DEFAULT_MAX_WORKERS)
+    parser.add_argument('--postprocessing-workers', type=int,
+                        default=DEFAULT_POSTPROCESSING_WORKERS)
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help='candidates waiting to be postprocessed before '
+                             'the scraping blocks')
+    args = parser.parse_args()
+    if args.sequential:
+        updated_usernames = []
+        scraping_error = None
+        try:
+            update_scrapped_tweets_csvs(max_workers=args.scraping_workers,
+                                        on_updated=updated_usernames.append)
+        except RuntimeError as error:
+            # the accounts updated before the failures are postprocessed
+            scraping_error = error
+        # only the accounts updated by this run, not every registered one
+        do_post_processing(incremental=True, usernames=updated_usernames)
+        if scraping_error:
+            raise scraping_error
+    else:
+        run_pipeline(scraping_workers=args.scraping_workers,
+                     postprocessing_workers=args.postprocessing_workers,
+                     queue_size=args.queue_size)
@@ -0,0 +1,143 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from tweet_scrapper import create_csvs, user_tweets
+from tweet_scrapper.activity import ActivityStore
+from tweet_scrapper.journal import ScrapeJournal
+from tweet_scrapper.rate_limit import TokenBucket
+from tweet_scrapper.reference_cache import ReferenceCache
+from tweet_scrapper.transport import SyntheticClient
+from tweet_scrapper.watermarks import WatermarkStore
+
+USERNAME = 'alice'
+N_TWEETS = 450
+
+
+class FailingClient(SyntheticClient):
+    """Fails the pages of `failing_tokens` with `error`"""
+
+    def __init__(self, failing_tokens=(), error=ConnectionError, **kwargs):
+        super().__init__(n_tweets=N_TWEETS, **kwargs)
+        self.failing_tokens = set(failing_tokens)
+        self.error = error
+        self.pages_count = 0
+
+    def request(self, method, route, params=None, **kwargs):
+        if route.endswith('/tweets') and route.startswith('/2/users/'):
+            if (params or {}).get('pagination_token') in self.failing_tokens:
+                raise self.error('page failed')
+            self.pages_count += 1
+        return super().request(method, route, params=params, **kwargs)
+
+
+@pytest.fixture
+def csv_path(tmp_path, monkeypatch):
+    csv_path = str(tmp_path / f'{USERNAME}.csv')
+    monkeypatch.setattr(create_csvs, 'ACCOUNTS_TWEET_CSVS',
+                        {USERNAME: csv_path})
+    monkeypatch.setattr(create_csvs, 'WATERMARKS',
+                        WatermarkStore(str(tmp_path / 'watermarks.json')))
+    monkeypatch.setattr(create_csvs, 'ACTIVITY',
+                        ActivityStore(str(tmp_path / 'activity.json')))
+    monkeypatch.setattr(create_csvs, 'REFERENCE_CACHE',
+                        ReferenceCache(str(tmp_path / 'references.sqlite')))
+    monkeypatch.setattr(user_tweets, 'USER_IDS_FILE',
+                        str(tmp_path / 'user_ids.json'))
+    monkeypatch.setattr(user_tweets, 'USER_TWEETS_RATE_LIMITER',
+                        TokenBucket(capacity=10 ** 9, period=1))
+    return csv_path
+
+
+def _ids(csv_path: str) -> list:
+    return pd.read_csv(csv_path, dtype=str)['id'].tolist()
+
+
+def _complete_ids() -> list:
+    client = SyntheticClient(n_tweets=N_TWEETS)
+    user_id = SyntheticClient._user_id(USERNAME)
+    return [str(client._tweet_id(user_id, index))
+            for index in range(N_TWEETS)]
+
+
+def test_interrupted_pagination_is_resumed(csv_path):
+    with pytest.raises(user_tweets.PaginationInterrupted):
+        create_csvs.update_candidate_csv(
+            USERNAME, client=FailingClient(failing_tokens={'200'}))
+    assert ScrapeJournal(csv_path).load()['next_token'] == '200'
+    assert len(_ids(csv_path)) == 200
+
+    client = FailingClient()
+    create_csvs.update_candidate_csv(USERNAME, client=client)
+    # only the pages that were not fetched
+    assert client.pages_count == 3
+    assert _ids(csv_path) == _complete_ids()
+    assert not ScrapeJournal(csv_path).exists()
+    assert (create_csvs.WATERMARKS.get(USERNAME)['since_id']
+            == _complete_ids()[0])
+
+
+def test_died_process_is_resumed_from_the_journal(csv_path):
+    # not an Exception: nothing is committed, like a killed process
+    with pytest.raises(KeyboardInterrupt):
+        create_csvs.update_candidate_csv(
+            USERNAME, client=FailingClient(failing_tokens={'300'},
+                                           error=KeyboardInterrupt))
+    assert ScrapeJournal(csv_path).load()['n_pages'] == 3
+
+    client = FailingClient()
+    create_csvs.update_candidate_csv(USERNAME, client=client)
+    assert client.pages_count == 2
+    assert _ids(csv_path) == _complete_ids()
+
+
+def test_failing_resume_token_is_dropped(csv_path):
+    with pytest.raises(user_tweets.PaginationInterrupted):
+        create_csvs.update_candidate_csv(
+            USERNAME, client=FailingClient(failing_tokens={'100'}))
+    for _ in range(create_csvs.MAX_FAILED_RESUMES):
+        with pytest.raises(user_tweets.PaginationInterrupted):
+            create_csvs.update_candidate_csv(
+                USERNAME, client=FailingClient(failing_tokens={'100'}))
+    assert ScrapeJournal(csv_path).load()['next_token'] is None
+
+    # new query from the since_id, the fetched tweets are not duplicated
+    create_csvs.update_candidate_csv(USERNAME, client=FailingClient())
+    assert _ids(csv_path) == _complete_ids()
+    assert not ScrapeJournal(csv_path).exists()
+
+
+def _page_df(first_index: int, n_tweets: int = 100) -> pd.DataFrame:
+    client = SyntheticClient(n_tweets=first_index + n_tweets)
+    user_id = SyntheticClient._user_id(USERNAME)
+    response = client.get_users_tweets(
+        user_id, max_results=n_tweets,
+        pagination_token=str(first_index) if first_index else None,
+        **user_tweets.GET_TWEET_ARGS)
+    includes = {'users': response.includes.get('users', []),
+                'tweets': response.includes.get('tweets', [])}
+    return create_csvs._tweets_to_df(USERNAME, response.data, includes,
+                                     client, create_csvs.REFERENCE_CACHE)
+
+
+def _staging_seconds(csv_path: str, n_known_ids: int,
+                     pages: list) -> float:
+    writer = create_csvs.StagedTweetsWriter(csv_path)
+    writer._known_ids.update(str(i) for i in range(n_known_ids))
+    start_time = time.perf_counter()
+    for page_df in pages:
+        writer.write(page_df)
+    seconds = time.perf_counter() - start_time
+    os.remove(writer.staging_path)
+    return seconds
+
+
+def test_staging_a_page_does_not_depend_on_the_history(csv_path):
+    pages = [_page_df(100 * i) for i in range(5)]
+    _staging_seconds(csv_path, 0, pages)  # warm up
+    small_history = _staging_seconds(csv_path, 1_000, pages)
+    # rebuilding a hashtable of the known ids for every page takes seconds
+    large_history = _staging_seconds(csv_path, 1_000_000, pages)
+    assert large_history < 5 * small_history + 0.1
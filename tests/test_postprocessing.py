@@ -0,0 +1,35 @@
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from tweet_postprocesser.postprocessing import (_unescape_html, get_own_text,
+                                                get_own_text_column,
+                                                get_replied_to_column)
+from tweet_scrapper.parse_tweet import TweetType
+
+
+def _tweets_df() -> pd.DataFrame:
+    return pd.DataFrame({
+        'type': [TweetType.REPLY.value, TweetType.REPLY.value,
+                 TweetType.NORMAL.value],
+        'text': ['@bob @carol_2022 merci pour votre soutien',
+                 'je reprends mon fil',
+                 '@bob bonjour'],
+    })
+
+
+def test_replied_to_column():
+    assert get_replied_to_column(_tweets_df()).tolist() == [
+        '@bob @carol_2022', '', '']
+
+
+def test_own_text_column_matches_get_own_text():
+    df = _tweets_df()
+    assert get_own_text_column(df).tolist() == [
+        get_own_text(row) for _, row in df.iterrows()]
+
+
+def test_unescape_html_shortcut_matches_beautifulsoup():
+    for text in ['\ufeffhola', 'a\ufeffb', 'a\x00b', '&amp;\x00',
+                 '\ufeff&amp;x', '&#65279;hola', 'x &#0; y', 'hola']:
+        assert (_unescape_html(text)
+                == BeautifulSoup(text, 'lxml').get_text())
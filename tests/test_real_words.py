@@ -0,0 +1,29 @@
+import json
+import multiprocessing
+
+from tweet_postprocesser.real_words import RealWordsCache
+
+
+def _save_words(json_path: str, prefix: str, n_saves: int):
+    for i in range(n_saves):
+        cache = RealWordsCache(json_path)
+        cache.get(f'{prefix}{i}', lambda word: True)
+        cache.save()
+
+
+def test_concurrent_saves_keep_every_word(tmp_path):
+    json_path = str(tmp_path / 'real_words.json')
+    n_saves = 50
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_save_words,
+                               args=(json_path, prefix, n_saves))
+               for prefix in ('alice', 'carol')]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    with open(json_path, 'r') as json_file:
+        words = json.load(json_file)
+    assert len(words) == 2 * n_saves
@@ -0,0 +1,146 @@
+import multiprocessing
+
+import pandas as pd
+
+from tweet_postprocesser.storage import (CsvStorage, ParquetStorage,
+                                         to_compact_frame)
+from tweet_scrapper.constants import TWEET_CSV_HEADER, TWEET_CSV_HEADER_DTYPES
+
+LONG_ID = '1512383652562448394'
+
+
+def _tweets_df() -> pd.DataFrame:
+    rows = [
+        {'username': 'alice', 'id': '1512383652562448395',
+         'datetime': '2022-04-08 12:00:00+00:00', 'type': 'Reply',
+         'text': '@bob merci', 'has_referenced_tweet': True,
+         'referenced_tweet_found': True,
+         'referenced_tweet_id': LONG_ID,
+         'referenced_tweet_text': 'bonjour',
+         'referenced_tweet_datetime': '2022-04-08 11:00:00+00:00',
+         'referenced_tweet_author_id': '1234567890123456789',
+         'referenced_tweet_author_name': 'Bob',
+         'referenced_tweet_author_username': 'bob'},
+        {'username': 'alice', 'id': '1512383652562448301',
+         'datetime': '2022-04-07 12:00:00+00:00', 'type': 'Tweet',
+         'text': 'bonjour', 'has_referenced_tweet': False,
+         'referenced_tweet_found': False},
+    ]
+    return (pd.DataFrame(rows, columns=TWEET_CSV_HEADER)
+            .astype(TWEET_CSV_HEADER_DTYPES, errors='ignore'))
+
+
+def _ids(series: pd.Series) -> list:
+    return [None if pd.isna(value) else str(value) for value in series]
+
+
+def test_parquet_round_trip_keeps_long_ids(tmp_path):
+    csv_storage = CsvStorage({'alice': str(tmp_path / 'alice.csv')},
+                             TWEET_CSV_HEADER_DTYPES)
+    parquet_storage = ParquetStorage(str(tmp_path / 'parquet'), ['alice'],
+                                     TWEET_CSV_HEADER_DTYPES)
+    csv_storage.write(_tweets_df(), 'alice')
+    csv_df = csv_storage.read('alice')
+    parquet_storage.write(csv_df, 'alice')
+    parquet_df = parquet_storage.read('alice')
+
+    assert parquet_df['referenced_tweet_id'].iloc[0] == LONG_ID
+    assert pd.isna(parquet_df['referenced_tweet_id'].iloc[1])
+    for column in ['id', 'referenced_tweet_id',
+                   'referenced_tweet_author_id']:
+        assert _ids(parquet_df[column]) == _ids(csv_df[column])
+
+
+def test_filter_on_long_referenced_id(tmp_path):
+    csv_storage = CsvStorage({'alice': str(tmp_path / 'alice.csv')},
+                             TWEET_CSV_HEADER_DTYPES)
+    csv_storage.write(_tweets_df(), 'alice')
+    df = csv_storage.read('alice',
+                          filters=[('referenced_tweet_id', '==', LONG_ID)])
+    assert df['referenced_tweet_id'].tolist() == [LONG_ID]
+
+
+def test_compact_frame_ids_match_string_ids(tmp_path):
+    csv_storage = CsvStorage({'alice': str(tmp_path / 'alice.csv')},
+                             TWEET_CSV_HEADER_DTYPES)
+    csv_storage.write(_tweets_df(), 'alice')
+    df = csv_storage.read('alice')
+    compact_df = to_compact_frame(df)
+
+    for column in ['id', 'referenced_tweet_id',
+                   'referenced_tweet_author_id']:
+        assert _ids(compact_df[column]) == _ids(df[column])
+
+
+def _write_normalised(storage, username: str, n_writes: int):
+    for i in range(n_writes):
+        df = _tweets_df().assign(
+            username=username,
+            referenced_tweet_text=[f'{username}-{i}', None])
+        storage.write(df, username)
+
+
+def test_normalised_shared_tables_across_processes(tmp_path, monkeypatch):
+    from tweet_postprocesser import storage as storage_module
+    monkeypatch.setattr(storage_module, 'REFERENCED_TWEETS_CSV',
+                        str(tmp_path / 'referenced_tweets.csv'))
+    monkeypatch.setattr(storage_module, 'REFERENCED_USERS_CSV',
+                        str(tmp_path / 'referenced_users.csv'))
+    storage = storage_module.NormalisedStorage(
+        str(tmp_path / 'normalised'), ['alice', 'carol'],
+        TWEET_CSV_HEADER_DTYPES)
+    n_writes = 20
+
+    # forked: the workers see the patched paths
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_write_normalised,
+                               args=(storage, username, n_writes))
+               for username in ('alice', 'carol')]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    referenced_tweets = pd.read_csv(tmp_path / 'referenced_tweets.csv',
+                                    dtype=str)
+    assert sorted(referenced_tweets['referenced_tweet_text']) == sorted(
+        f'{username}-{i}' for username in ('alice', 'carol')
+        for i in range(n_writes))
+
+
+def test_normalised_round_trip_equals_csv(tmp_path, monkeypatch):
+    from tweet_postprocesser import storage as storage_module
+    monkeypatch.setattr(storage_module, 'REFERENCED_TWEETS_CSV',
+                        str(tmp_path / 'referenced_tweets.csv'))
+    monkeypatch.setattr(storage_module, 'REFERENCED_USERS_CSV',
+                        str(tmp_path / 'referenced_users.csv'))
+    csv_storage = CsvStorage({'alice': str(tmp_path / 'alice.csv'),
+                              'carol': str(tmp_path / 'carol.csv')},
+                             TWEET_CSV_HEADER_DTYPES)
+    normalised_storage = storage_module.NormalisedStorage(
+        str(tmp_path / 'normalised'), ['alice', 'carol'],
+        TWEET_CSV_HEADER_DTYPES)
+    alice_df = _tweets_df()
+    # same referenced tweet, edited, by its author under another name
+    carol_df = _tweets_df().assign(
+        username='carol',
+        referenced_tweet_text=['bonjour à tous', None],
+        referenced_tweet_author_name=['Bob (officiel)', None])
+    # found later, without its text and its author
+    not_found = carol_df.iloc[:1].assign(
+        id='1512383652562448390', referenced_tweet_found=False,
+        referenced_tweet_text='', referenced_tweet_datetime='',
+        referenced_tweet_author_id='', referenced_tweet_author_name='',
+        referenced_tweet_author_username='')
+    carol_df = pd.concat([carol_df, not_found], ignore_index=True)
+
+    for username, df in (('alice', alice_df), ('carol', carol_df)):
+        csv_storage.write(df, username)
+        normalised_storage.write(csv_storage.read(username), username)
+    for username in ('alice', 'carol'):
+        pd.testing.assert_frame_equal(normalised_storage.read(username),
+                                      csv_storage.read(username))
+        columns = ['id', 'referenced_tweet_author_name']
+        pd.testing.assert_frame_equal(
+            normalised_storage.read(username, columns),
+            csv_storage.read(username, columns))
@@ -0,0 +1,31 @@
+import pandas as pd
+
+from tweet_postprocesser.term_index import TermIndex
+
+
+def _tweets_df(texts: list) -> pd.DataFrame:
+    return pd.DataFrame({
+        'id': ['1', '2', '3'],
+        'datetime': ['2022-03-01 10:00:00+00:00',
+                     '2022-03-01 12:00:00+00:00',
+                     '2022-03-09 08:00:00+00:00'],
+        'cleaned_text': texts,
+    })
+
+
+def _counts(term_index: TermIndex, terms: list) -> tuple:
+    return ({term: term_index.weekly_counts(term) for term in terms},
+            sorted(term_index.top_terms(k=100)))
+
+
+def test_reindexed_tweet_counts_equal_a_recount(tmp_path):
+    term_index = TermIndex(str(tmp_path / 'reindexed.sqlite'))
+    term_index.update('alice', _tweets_df(['salud salud', 'salud', 'paz']))
+    final_df = _tweets_df(['salud salud', 'trabajo paz', 'paz'])
+    assert term_index.update('alice', final_df) == 1
+
+    recount_index = TermIndex(str(tmp_path / 'recount.sqlite'))
+    recount_index.update('alice', final_df)
+    terms = ['salud', 'paz', 'trabajo']
+    assert _counts(term_index, terms) == _counts(recount_index, terms)
+    assert term_index.tweet_ids('trabajo') == [2]
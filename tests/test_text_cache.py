@@ -0,0 +1,24 @@
+from tweet_postprocesser.text_cache import TextCache
+
+
+def test_hits_and_misses_are_counted_per_occurrence():
+    cache = TextCache('test')
+    assert cache.get_many(['a', 'b', 'a', 'a']) == {}
+    # 'a' is only computed once
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    cache.put_many({'a': 'A'})
+    assert cache.get_many(['a', 'a', 'b']) == {'a': 'A'}
+    assert (cache.hits, cache.misses) == (4, 3)
+
+
+def test_persisted_hits_are_counted_per_occurrence(tmp_path):
+    db_path = str(tmp_path / 'text_cache.sqlite')
+    cache = TextCache('test', db_path=db_path)
+    cache.put_many({'a': 'A'})
+    cache.close()
+
+    cache = TextCache('test', db_path=db_path)
+    assert cache.get_many(['a', 'a', 'a']) == {'a': 'A'}
+    assert (cache.persisted_hits, cache.misses) == (3, 0)
+    cache.close()
@@ -0,0 +1,17 @@
+from tweet_scrapper.user_tweets import _slice_boundaries
+
+
+def test_slice_boundaries_keep_a_lower_bound():
+    boundaries = _slice_boundaries(newest_id=1000, oldest_id=901,
+                                   n_fetched=100, n_slices=8)
+    assert boundaries == sorted(boundaries, reverse=True)
+    # boundaries[i + 1] - 1 is the since_id of slice i
+    assert all(boundary - 1 >= 1 for boundary in boundaries)
+
+
+def test_slice_boundaries_split_the_older_ids():
+    boundaries = _slice_boundaries(newest_id=10 ** 18 + 99_000,
+                                   oldest_id=10 ** 18,
+                                   n_fetched=100, n_slices=4)
+    assert boundaries[0] == 10 ** 18
+    assert len(set(boundaries)) == 4
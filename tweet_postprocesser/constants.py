@@ -1,10 +1,15 @@
 import os
 
-from tweet_scrapper.constants import CANDIDATES_TWEET_CSVS, DATA_DIR
-from tweet_scrapper.create_csvs import TWEET_CSV_HEADER_DTYPES
+from tweet_scrapper.constants import (ACCOUNTS_TWEET_CSVS, DATA_DIR,
+                                      TWEET_CSV_HEADER_DTYPES,
+                                      get_account_tweets_csv)
 
 TWEETS_DIR = os.path.join(DATA_DIR, 'postprocessed_tweets')
 REAL_WORDS_JSON = os.path.join(DATA_DIR, 'real_words.json')
+TERM_INDEX_FILE = os.path.join(DATA_DIR, 'term_index.sqlite')
+TEXT_CACHE_FILE = os.path.join(DATA_DIR, 'text_cache.sqlite')
+# persist the cleaned texts between runs in TEXT_CACHE_FILE
+TEXT_CACHE_PERSISTED = os.getenv('TWEETS_TEXT_CACHE_PERSISTED') == '1'
 
 POSTPROCESSED_COLUMN_HEADERS = [
     # for quoted tweets: get rid of quoted text (so it can be '')
@@ -24,10 +29,24 @@ POSTPROCESSED_TWEET_HEADER_DTYPES.update({
     in zip(POSTPROCESSED_COLUMN_HEADERS, _POSTPROCESSED_COLUMN_HEADER_DTYPES)
 })
 
-POSTPROCESSED_TWEET_CSVS = {}
-for candidate, path in CANDIDATES_TWEET_CSVS.items():
-    scrapped_tweets_dir, filename = os.path.split(path)
-    postprocessed_tweets_dir = os.path.join(
-        os.path.dirname(scrapped_tweets_dir), TWEETS_DIR)
-    POSTPROCESSED_TWEET_CSVS[candidate] = os.path.join(
-        postprocessed_tweets_dir, filename)
+# same layout as the scrapped CSVs, sharded for the non-candidate accounts
+POSTPROCESSED_TWEET_CSVS = {
+    username: get_account_tweets_csv(username, TWEETS_DIR)
+    for username in ACCOUNTS_TWEET_CSVS
+}
+
+# 'csv' (default), 'parquet' or 'normalised' for the postprocessed tweets,
+# see tweet_postprocesser.storage
+STORAGE_BACKEND = os.getenv('TWEETS_STORAGE_BACKEND', 'csv')
+
+PARQUET_DIR = os.path.join(DATA_DIR, 'parquet')
+SCRAPPED_PARQUET_DIR = os.path.join(PARQUET_DIR, 'scrapped_tweets')
+POSTPROCESSED_PARQUET_DIR = os.path.join(PARQUET_DIR, 'postprocessed_tweets')
+
+NORMALISED_DIR = os.path.join(DATA_DIR, 'normalised')
+SCRAPPED_NORMALISED_DIR = os.path.join(NORMALISED_DIR, 'scrapped_tweets')
+POSTPROCESSED_NORMALISED_DIR = os.path.join(NORMALISED_DIR,
+                                            'postprocessed_tweets')
+# shared by all the candidates and both datasets
+REFERENCED_TWEETS_CSV = os.path.join(NORMALISED_DIR, 'referenced_tweets.csv')
+REFERENCED_USERS_CSV = os.path.join(NORMALISED_DIR, 'referenced_users.csv')
@@ -1,46 +1,106 @@
-import csv
-from typing import Dict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 import pandas as pd
 
-from tweet_postprocesser.constants import (CANDIDATES_TWEET_CSVS,
-                                           POSTPROCESSED_TWEET_CSVS,
-                                           POSTPROCESSED_TWEET_HEADER_DTYPES,
-                                           TWEET_CSV_HEADER_DTYPES)
-
-
-def read_scrapped_csvs() -> Dict[str, pd.DataFrame]:
-    csvs = {}
-    for username, csv_path in CANDIDATES_TWEET_CSVS.items():
-        df = pd.read_csv(csv_path,
-                         header=0,
-                         dtype=TWEET_CSV_HEADER_DTYPES)
-        csvs[username] = df
-    return csvs
-
-
-def save_postprocessed_csv(df: pd.DataFrame, username: str):
-    for username_, csv_path in POSTPROCESSED_TWEET_CSVS.items():
-        if username_ == username:
-            return df.to_csv(csv_path,
-                             index=False,
-                             quoting=csv.QUOTE_NONNUMERIC)
-    raise ValueError(username)
-
-
-def save_postprocessed_csvs(dfs: Dict[str, pd.DataFrame]):
-    for username, csv_path in POSTPROCESSED_TWEET_CSVS.items():
-        df = dfs[username]
-        df.to_csv(csv_path,
-                  index=False,
-                  quoting=csv.QUOTE_NONNUMERIC)
-
-
-def read_postprocessed_csvs() -> Dict[str, pd.DataFrame]:
-    csvs = {}
-    for username, csv_path in POSTPROCESSED_TWEET_CSVS.items():
-        df = pd.read_csv(csv_path,
-                         header=0,
-                         dtype=POSTPROCESSED_TWEET_HEADER_DTYPES)
-        csvs[username] = df
-    return csvs
+from tweet_postprocesser.storage import (Filters, get_postprocessed_storage,
+                                         get_scrapped_storage,
+                                         to_compact_frame)
+
+
+def _iter_storage(storage,
+                  columns: Optional[List[str]] = None,
+                  filters: Optional[Filters] = None,
+                  compact: bool = False,
+                  pyarrow_strings: bool = False,
+                  usernames: Optional[Iterable[str]] = None
+                  ) -> Iterator[Tuple[str, pd.DataFrame]]:
+    for username in (storage.usernames if usernames is None else usernames):
+        # registered accounts that were never scrapped
+        if not storage.exists(username):
+            continue
+        df = storage.read(username, columns, filters)
+        if compact:
+            df = to_compact_frame(df, pyarrow_strings)
+        yield username, df
+
+
+def iter_scrapped_csvs(columns: Optional[List[str]] = None,
+                       filters: Optional[Filters] = None,
+                       backend: Optional[str] = None,
+                       compact: bool = False,
+                       pyarrow_strings: bool = False,
+                       usernames: Optional[Iterable[str]] = None
+                       ) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """Yields (username, frame) one candidate at a time, so only one of them
+    is loaded at once. `compact` frames have typed ids and datetimes and
+    categorical columns, see to_compact_frame. All the accounts unless
+    `usernames` are given."""
+    return _iter_storage(get_scrapped_storage(backend), columns, filters,
+                         compact, pyarrow_strings, usernames)
+
+
+def read_scrapped_csvs(columns: Optional[List[str]] = None,
+                       filters: Optional[Filters] = None,
+                       backend: Optional[str] = None,
+                       compact: bool = False,
+                       pyarrow_strings: bool = False
+                       ) -> Dict[str, pd.DataFrame]:
+    return dict(iter_scrapped_csvs(columns, filters, backend,
+                                   compact, pyarrow_strings))
+
+
+def read_scrapped_csv(username: str,
+                      columns: Optional[List[str]] = None,
+                      filters: Optional[Filters] = None,
+                      backend: Optional[str] = None) -> pd.DataFrame:
+    return get_scrapped_storage(backend).read(username, columns, filters)
+
+
+def save_postprocessed_csv(df: pd.DataFrame, username: str,
+                           backend: Optional[str] = None):
+    storage = get_postprocessed_storage(backend)
+    if not storage.has_account(username):
+        raise ValueError(username)
+    return storage.write(df, username)
+
+
+def save_postprocessed_csvs(dfs: Dict[str, pd.DataFrame],
+                            backend: Optional[str] = None):
+    storage = get_postprocessed_storage(backend)
+    for username, df in dfs.items():
+        if not storage.has_account(username):
+            raise ValueError(username)
+        storage.write(df, username)
+
+
+def iter_postprocessed_csvs(columns: Optional[List[str]] = None,
+                            filters: Optional[Filters] = None,
+                            backend: Optional[str] = None,
+                            compact: bool = False,
+                            pyarrow_strings: bool = False
+                            ) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """Same as iter_scrapped_csvs, for the postprocessed tweets"""
+    return _iter_storage(get_postprocessed_storage(backend), columns,
+                         filters, compact, pyarrow_strings)
+
+
+def read_postprocessed_csvs(columns: Optional[List[str]] = None,
+                            filters: Optional[Filters] = None,
+                            backend: Optional[str] = None,
+                            compact: bool = False,
+                            pyarrow_strings: bool = False
+                            ) -> Dict[str, pd.DataFrame]:
+    return dict(iter_postprocessed_csvs(columns, filters, backend,
+                                        compact, pyarrow_strings))
+
+
+def read_postprocessed_csv(username: str,
+                           columns: Optional[List[str]] = None,
+                           filters: Optional[Filters] = None,
+                           backend: Optional[str] = None
+                           ) -> Optional[pd.DataFrame]:
+    """None if the candidate was never postprocessed"""
+    storage = get_postprocessed_storage(backend)
+    if not storage.exists(username):
+        return None
+    return storage.read(username, columns, filters)
@@ -0,0 +1,104 @@
+"""Scraping and postprocessing running concurrently.
+
+Scraping threads (see do_update) put every candidate whose CSV was updated in
+a bounded queue, consumed by postprocessing worker processes that each load
+the spaCy model once. When the postprocessing falls behind, the full queue
+blocks the scraping threads until a worker is free.
+"""
+import multiprocessing
+import queue
+from typing import Iterable, List, Optional
+
+from tweet_postprocesser.csv_io import read_scrapped_csv
+from tweet_postprocesser.postprocessing import (
+    CLEANED_TEXTS_CACHE, DEFAULT_BATCH_SIZE, REAL_WORDS_CACHE, get_nlp,
+    post_process_and_save_candidate, report_cache_metrics)
+from tweet_scrapper.create_csvs import DEFAULT_MAX_WORKERS, do_update
+from tweet_scrapper.metrics import METRICS
+
+DEFAULT_POSTPROCESSING_WORKERS = 2
+# candidates waiting to be postprocessed before the scraping blocks
+DEFAULT_QUEUE_SIZE = 4
+
+_STOP = None
+
+
+def _post_processing_worker(tasks: multiprocessing.Queue,
+                            results: multiprocessing.Queue,
+                            batch_size: int,
+                            with_replied_to: bool):
+    get_nlp()  # while waiting for the first candidate
+    while True:
+        username = tasks.get()
+        if username is _STOP:
+            break
+        try:
+            post_process_and_save_candidate(
+                username, read_scrapped_csv(username),
+                incremental=True,
+                batch_size=batch_size,
+                with_replied_to=with_replied_to)
+            results.put(('done', username, None))
+        except Exception as error:
+            results.put(('done', username, repr(error)))
+    REAL_WORDS_CACHE.save()
+    print(f'cleaned texts cache: {CLEANED_TEXTS_CACHE.stats()}')
+    report_cache_metrics()
+    results.put(('metrics', None, METRICS.state()))
+
+
+def run_pipeline(scraping_workers: int = DEFAULT_MAX_WORKERS,
+                 postprocessing_workers: int = DEFAULT_POSTPROCESSING_WORKERS,
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 with_replied_to: bool = False,
+                 usernames: Optional[Iterable[str]] = None):
+    """Same result as do_update followed by an incremental
+    do_post_processing, in about the time of the longest of the two"""
+    # spawn: the workers must not inherit the locks of the scraping threads
+    context = multiprocessing.get_context('spawn')
+    tasks = context.Queue(maxsize=queue_size)
+    results = context.Queue()
+    workers = [context.Process(target=_post_processing_worker,
+                               args=(tasks, results, batch_size,
+                                     with_replied_to),
+                               daemon=True)
+               for _ in range(postprocessing_workers)]
+    for worker in workers:
+        worker.start()
+
+    scraping_error = None
+    try:
+        do_update(max_workers=scraping_workers,
+                  usernames=usernames,
+                  on_updated=tasks.put)
+    except RuntimeError as error:
+        # failed candidates are not postprocessed, the others are
+        scraping_error = error
+    finally:
+        for _ in workers:
+            tasks.put(_STOP)
+
+    failed_usernames: List[str] = []
+    n_stopped = 0
+    while n_stopped < len(workers):
+        try:
+            kind, username, payload = results.get(timeout=5)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                raise RuntimeError('the postprocessing workers died')
+            continue
+        if kind == 'metrics':
+            METRICS.merge(payload)
+            n_stopped += 1
+        elif payload:
+            print(f'ERROR - failed to postprocess {username}: {payload}')
+            failed_usernames.append(username)
+    for worker in workers:
+        worker.join()
+    METRICS.flush(run='pipeline')
+
+    if scraping_error:
+        raise scraping_error
+    if failed_usernames:
+        raise RuntimeError(f'failed to postprocess {failed_usernames}')
@@ -1,20 +1,52 @@
+import html
 import re
 import time
-from typing import Dict, Tuple
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
 
 import pandas as pd
-import spacy
 from bs4 import BeautifulSoup
 
-from tweet_postprocesser.csv_io import (read_scrapped_csvs,
+from tweet_postprocesser.constants import TEXT_CACHE_FILE, TEXT_CACHE_PERSISTED
+from tweet_postprocesser.csv_io import (iter_scrapped_csvs,
+                                        read_postprocessed_csv,
                                         save_postprocessed_csv)
+from tweet_postprocesser.real_words import RealWordsCache
+from tweet_postprocesser.term_index import TermIndex
+from tweet_postprocesser.text_cache import TextCache
+from tweet_scrapper.metrics import METRICS
 from tweet_scrapper.parse_tweet import TweetType
 
-nlp = spacy.load('fr_core_news_md')
+
+@lru_cache(maxsize=None)
+def get_nlp():
+    """Loaded on first use, once per process"""
+    import spacy
+    return spacy.load('fr_core_news_md')
+
+
+# the cleaner only reads lexical token flags (is_stop, is_punct...), which are
+# set by the tokenizer alone: none of these components changes its output
+UNUSED_PIPES = ['tok2vec', 'morphologizer', 'parser', 'attribute_ruler',
+                'lemmatizer', 'ner']
+DEFAULT_BATCH_SIZE = 1000
+
+REAL_WORDS_CACHE = RealWordsCache()
+
+TERM_INDEX = TermIndex()
+
+# the same texts come back across candidates (retweets, quotes, accounts
+# echoing each other): each distinct text is only cleaned once
+CLEANED_TEXTS_CACHE = TextCache(
+    'cleaned_text', db_path=TEXT_CACHE_FILE if TEXT_CACHE_PERSISTED else None)
 
 
 USERNAME_REGEX = re.compile('@(\\w){1,30}')
+# interpolates the repr of USERNAME_REGEX, so it never matches and the own
+# text of a reply is its whole text: kept for the own texts already computed
 REPLY_TO_REGEX = re.compile(f'^(({USERNAME_REGEX} )+)')
+# what REPLY_TO_REGEX was meant to be, for the replied_to column
+REPLIED_TO_REGEX = re.compile(f'^((?:{USERNAME_REGEX.pattern} )+)')
 TWEET_URL_REGEX = re.compile('https?:\\/\\/t\\.co\\/[0-9a-zA-Z\\-\\_]{5,30}$')
 HASHTAG_REGEX = re.compile('#(\\w+)')
 
@@ -34,17 +66,23 @@ EMOJIS_REGEX_2 = re.compile(
 URL_REGEX = re.compile(r'(https?://)?(www\.)?(\w+\.)?(\w+)(\.\w+)(/.+)?')
 PUNCTUATION_REGEX = re.compile('(\\.{2,100})|(#)')
 WEIRD_CHARACTERS_REGEX = re.compile('(\\[\\.+\\])|[«»‹›!\\?"\']')
+# characters without which WEIRD_CHARACTERS_REGEX can't match
+WEIRD_CHARACTERS = set('[«»‹›!?"\'')
+
+# both emoji regexes only remove single characters (or runs of them), so
+# removing them in a single pass gives the same text as one after the other
+EMOJIS_FUSED_REGEX = re.compile(
+    f'{EMOJIS_REGEX.pattern}|{EMOJIS_REGEX_2.pattern}', flags=re.UNICODE)
 
 
 def extract_replied_to(tweet_text) -> Tuple[Tuple[str], str]:
-    cleaned_text = re.sub(REPLY_TO_REGEX, '', tweet_text, count=1)
-    if cleaned_text == tweet_text:
+    match = REPLY_TO_REGEX.match(tweet_text)
+    if not match:
         # user replied to themselves
         return tuple(), tweet_text
     else:
-        usernames = re.match(REPLY_TO_REGEX, tweet_text).groups()[0]
-        usernames = tuple(usernames.rstrip(' ').split(' '))
-        return usernames, cleaned_text
+        usernames = tuple(match.groups()[0].rstrip(' ').split(' '))
+        return usernames, tweet_text[match.end():]
 
 
 def extract_quoting_own_text(tweet_text) -> str:
@@ -67,10 +105,40 @@ def get_own_text(tweets_csv_row) -> str:
         raise ValueError(tweet_type)
 
 
-def is_real_word(word: str) -> bool:
-    if len(word) <= 1 and not word.isalpha():
-        return False
-    tokens = nlp(word)
+def get_own_text_column(df: pd.DataFrame) -> pd.Series:
+    """Vectorized get_own_text over the whole frame"""
+    tweet_types = df['type']
+    texts = df['text']
+    unknown_types = ~tweet_types.isin([tweet_type.value
+                                       for tweet_type in TweetType])
+    if unknown_types.any():
+        raise ValueError(tweet_types[unknown_types].iloc[0])
+
+    own_text = pd.Series('', index=df.index, dtype=object)
+    is_normal = tweet_types == TweetType.NORMAL.value
+    own_text[is_normal] = texts[is_normal]
+    is_reply = tweet_types == TweetType.REPLY.value
+    own_text[is_reply] = texts[is_reply].str.replace(REPLY_TO_REGEX, '',
+                                                     n=1, regex=True)
+    is_quoting = tweet_types == TweetType.QUOTING.value
+    own_text[is_quoting] = (texts[is_quoting]
+                            .str.replace(TWEET_URL_REGEX, '', regex=True)
+                            .str.rstrip())
+    return own_text
+
+
+def get_replied_to_column(df: pd.DataFrame) -> pd.Series:
+    """Space-separated @usernames the replies start with, '' for the other
+    tweets"""
+    is_reply = df['type'] == TweetType.REPLY.value
+    usernames = df.loc[is_reply, 'text'].str.extract(REPLIED_TO_REGEX)[0]
+    replied_to = pd.Series('', index=df.index, dtype=object)
+    replied_to[is_reply] = usernames.str.rstrip(' ').fillna('')
+    return replied_to
+
+
+def _classify_word(word: str) -> bool:
+    tokens = get_nlp()(word)
     if not (hasattr(tokens, 'is_oov') or len(tokens) == 1):
         return False
     if hasattr(tokens, 'is_oov'):
@@ -79,23 +147,34 @@ def is_real_word(word: str) -> bool:
         return not tokens[0].is_oov
 
 
-def _remove_multiple_regex(text: str, regexes: list) -> str:
-    res = text
-    for regex in regexes:
-        res = re.sub(regex, '', res)
-    return res
+def is_real_word(word: str) -> bool:
+    if len(word) <= 1 and not word.isalpha():
+        return False
+    return REAL_WORDS_CACHE.get(word, _classify_word)
 
 
-def clean_tweet_text(tweet_text: str) -> str:
-    no_emojis_text = re.sub(EMOJIS_REGEX, '', tweet_text)
-    no_emojis_text = re.sub(EMOJIS_REGEX_2, '', no_emojis_text)
+def _remove_emojis(text: str) -> str:
+    if text.isascii():
+        return text
+    return re.sub(EMOJIS_FUSED_REGEX, '', text)
 
-    no_url_text = re.sub(URL_REGEX, '', no_emojis_text)
 
-    no_username_text = re.sub(USERNAME_REGEX, '', no_url_text)
+def _remove_urls(text: str) -> str:
+    if '.' not in text:
+        return text
+    return re.sub(URL_REGEX, '', text)
+
+
+def _remove_usernames(text: str) -> str:
+    if '@' not in text:
+        return text
+    return re.sub(USERNAME_REGEX, '', text)
 
-    lowercase_text = no_username_text.lower()
 
+def _remove_pure_hashtags(lowercase_text: str) -> str:
+    """Removes the hashtags that are not real words"""
+    if '#' not in lowercase_text:
+        return lowercase_text
     hashtags = set(re.findall(HASHTAG_REGEX, lowercase_text))
     cleaned_hashtags_text = lowercase_text
     if hashtags:
@@ -104,12 +183,40 @@ def clean_tweet_text(tweet_text: str) -> str:
         for pure_hashtag in pure_hashtags:
             cleaned_hashtags_text = cleaned_hashtags_text.replace(
                 f'#{pure_hashtag}', '')
+    return cleaned_hashtags_text
+
+
+def _unescape_html(text: str) -> str:
+    """The API escapes every '&', '<' and '>' of the tweets, so decoding the
+    entities is enough unless there is markup left. As BeautifulSoup, drops
+    a leading byte order mark and replaces the NUL characters."""
+    if '<' in text:
+        return BeautifulSoup(text, 'lxml').get_text()
+    if text.startswith('\ufeff'):
+        text = text[1:]
+    if '&' in text:
+        text = html.unescape(text)
+    if '\x00' in text:
+        text = text.replace('\x00', '\ufffd')
+    return text
+
 
-    no_html_text = BeautifulSoup(cleaned_hashtags_text, 'lxml').get_text()
+def _pre_clean_text(tweet_text: str) -> str:
+    text = _remove_usernames(_remove_urls(_remove_emojis(tweet_text)))
+    return _unescape_html(_remove_pure_hashtags(text.lower()))
 
-    cleaned_text_tokens = nlp(no_html_text)
+
+def _remove_punctuation(text: str) -> str:
+    if '.' in text or '#' in text:
+        text = re.sub(PUNCTUATION_REGEX, '', text)
+    if not WEIRD_CHARACTERS.isdisjoint(text):
+        text = re.sub(WEIRD_CHARACTERS_REGEX, '', text)
+    return text
+
+
+def _join_cleaned_tokens(tokens) -> str:
     cleaned_text_tokens = [
-        token_.text for token_ in cleaned_text_tokens
+        token_.text for token_ in tokens
         if not (token_.is_quote
                 or token_.is_stop
                 or token_.is_digit
@@ -119,26 +226,152 @@ def clean_tweet_text(tweet_text: str) -> str:
                 or token_.is_currency)
     ]
 
-    cleaned_text = ' '.join(cleaned_text_tokens)
-    cleaned_text = _remove_multiple_regex(cleaned_text,
-                                          [PUNCTUATION_REGEX,
-                                           WEIRD_CHARACTERS_REGEX])
+    return _remove_punctuation(' '.join(cleaned_text_tokens))
+
 
+def _set_cleaned_texts_namespace(nlp):
+    # persisted cleaned texts are only valid for the model that cleaned them
+    CLEANED_TEXTS_CACHE.namespace = (
+        f"cleaned_text:{nlp.meta['name']}-{nlp.meta['version']}")
+
+
+def clean_tweet_text(tweet_text: str) -> str:
+    nlp = get_nlp()
+    _set_cleaned_texts_namespace(nlp)
+    cleaned_text = CLEANED_TEXTS_CACHE.get(tweet_text)
+    if cleaned_text is None:
+        cleaned_text = _join_cleaned_tokens(nlp(_pre_clean_text(tweet_text)))
+        CLEANED_TEXTS_CACHE.put(tweet_text, cleaned_text)
     return cleaned_text
 
 
-def do_post_processing():
-    scrapped_csvs_dfs: Dict[str, pd.DataFrame] = read_scrapped_csvs()
-    for username, df in scrapped_csvs_dfs.items():
-        start_time = time.time()
-        print(f'postprocessing {len(df)} tweets of {username}...')
-        own_text_column = df.apply(get_own_text, axis=1)
-        df['own_text'] = own_text_column
-        cleaned_text_column = own_text_column.apply(clean_tweet_text)
-        df['cleaned_text'] = cleaned_text_column
-        spent_minutes = (time.time() - start_time)/60
-        print(f'postprocessed in {round(spent_minutes, 1)} min')
+def clean_tweet_texts(tweet_texts: Iterable[str],
+                      batch_size: int = DEFAULT_BATCH_SIZE,
+                      n_process: int = 1) -> List[str]:
+    """Same output as clean_tweet_text, but streams the distinct texts
+    missing from CLEANED_TEXTS_CACHE through nlp.pipe with the unused
+    pipeline components disabled.
+    """
+    tweet_texts = list(tweet_texts)
+    nlp = get_nlp()
+    _set_cleaned_texts_namespace(nlp)
+    cleaned_texts = CLEANED_TEXTS_CACHE.get_many(tweet_texts)
+    texts_to_clean = [text for text in dict.fromkeys(tweet_texts)
+                      if text not in cleaned_texts]
+    disabled_pipes = [pipe for pipe in UNUSED_PIPES if pipe in nlp.pipe_names]
+    docs = nlp.pipe((_pre_clean_text(text) for text in texts_to_clean),
+                    batch_size=batch_size,
+                    n_process=n_process,
+                    disable=disabled_pipes)
+    new_cleaned_texts = {text: _join_cleaned_tokens(doc)
+                         for text, doc in zip(texts_to_clean, docs)}
+    CLEANED_TEXTS_CACHE.put_many(new_cleaned_texts)
+    cleaned_texts.update(new_cleaned_texts)
+    return [cleaned_texts[text] for text in tweet_texts]
+
+
+def _get_rows_to_process(df: pd.DataFrame,
+                         previous_df: pd.DataFrame) -> pd.Series:
+    """Rows whose id is not postprocessed yet or whose text changed"""
+    previous_texts = (previous_df.drop_duplicates(subset='id')
+                      .set_index('id')['text'])
+    is_known = df['id'].isin(previous_texts.index)
+    same_text = df['id'].map(previous_texts) == df['text']
+    return ~(is_known & same_text)
+
+
+def post_process_candidate(username: str,
+                           df: pd.DataFrame,
+                           incremental: bool = False,
+                           batch_size: int = DEFAULT_BATCH_SIZE,
+                           n_process: int = 1,
+                           with_replied_to: bool = False) -> pd.DataFrame:
+    """Adds the POSTPROCESSED_COLUMN_HEADERS columns to the scrapped tweets,
+    and the 'replied_to' usernames column if `with_replied_to`.
+    In incremental mode, the columns of the tweets already present in the
+    postprocessed CSV are reused instead of being computed again.
+    """
+    to_process = pd.Series(True, index=df.index)
+    df['own_text'] = ''
+    df['cleaned_text'] = ''
+
+    previous_df = read_postprocessed_csv(username) if incremental else None
+    if previous_df is not None:
+        to_process = _get_rows_to_process(df, previous_df)
+        previous = previous_df.drop_duplicates(subset='id').set_index('id')
+        reused_ids = df.loc[~to_process, 'id']
+        for column in ('own_text', 'cleaned_text'):
+            df.loc[~to_process, column] = (
+                reused_ids.map(previous[column]).fillna(''))
+
+    print(f'postprocessing {to_process.sum()} tweets of {username} '
+          f'({(~to_process).sum()} already postprocessed)...')
+    METRICS.inc('tweets_postprocessed', int(to_process.sum()),
+                candidate=username)
+    METRICS.inc('tweets_reused', int((~to_process).sum()),
+                candidate=username)
+    if to_process.any():
+        with METRICS.timer('own_text', candidate=username):
+            own_text_column = get_own_text_column(df[to_process])
+        df.loc[to_process, 'own_text'] = own_text_column
+        with METRICS.timer('cleaning', candidate=username):
+            df.loc[to_process, 'cleaned_text'] = clean_tweet_texts(
+                own_text_column, batch_size=batch_size, n_process=n_process)
+    if with_replied_to:
+        df['replied_to'] = get_replied_to_column(df)
+    return df
+
+
+def post_process_and_save_candidate(username: str,
+                                    df: pd.DataFrame,
+                                    incremental: bool = False,
+                                    batch_size: int = DEFAULT_BATCH_SIZE,
+                                    n_process: int = 1,
+                                    with_replied_to: bool = False):
+    """post_process_candidate, then saves the postprocessed tweets and
+    indexes them"""
+    start_time = time.time()
+    with METRICS.timer('postprocess_candidate', candidate=username):
+        df = post_process_candidate(username, df,
+                                    incremental=incremental,
+                                    batch_size=batch_size,
+                                    n_process=n_process,
+                                    with_replied_to=with_replied_to)
+    spent_minutes = (time.time() - start_time)/60
+    print(f'postprocessed in {round(spent_minutes, 1)} min')
+    with METRICS.timer('save_postprocessed', candidate=username):
         save_postprocessed_csv(df, username)
+    with METRICS.timer('term_index', candidate=username):
+        TERM_INDEX.update(username, df)
+
+
+def report_cache_metrics():
+    METRICS.inc('text_cache_hits',
+                CLEANED_TEXTS_CACHE.hits + CLEANED_TEXTS_CACHE.persisted_hits,
+                cache='cleaned_text')
+    METRICS.inc('text_cache_misses', CLEANED_TEXTS_CACHE.misses,
+                cache='cleaned_text')
+
+
+def do_post_processing(incremental: bool = False,
+                       batch_size: int = DEFAULT_BATCH_SIZE,
+                       n_process: int = 1,
+                       with_replied_to: bool = False,
+                       usernames: Optional[Iterable[str]] = None):
+    """Postprocesses every scrapped account, or only `usernames`, e.g. the
+    accounts updated by the last scraping"""
+    # one candidate in memory at a time
+    for username, df in iter_scrapped_csvs(usernames=usernames):
+        post_process_and_save_candidate(username, df,
+                                        incremental=incremental,
+                                        batch_size=batch_size,
+                                        n_process=n_process,
+                                        with_replied_to=with_replied_to)
+    REAL_WORDS_CACHE.save()
+    print(f'real words cache: {REAL_WORDS_CACHE.stats()}')
+    print(f'cleaned texts cache: {CLEANED_TEXTS_CACHE.stats()}')
+    report_cache_metrics()
+    METRICS.flush(run='postprocessing')
 
 
 if __name__ == '__main__':
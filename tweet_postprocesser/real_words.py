@@ -0,0 +1,60 @@
+import json
+import os
+from typing import Callable, Dict
+
+from tweet_postprocesser.constants import REAL_WORDS_JSON
+from tweet_scrapper.caches import CacheStats
+from tweet_scrapper.files import atomic_path, file_lock
+
+
+class RealWordsCache(CacheStats):
+    """Memoizes the is_real_word decisions of the hashtags.
+    Lives in memory during a run and is persisted to REAL_WORDS_JSON between
+    runs.
+    """
+
+    def __init__(self, json_path: str = REAL_WORDS_JSON):
+        super().__init__()
+        self.json_path = json_path
+        self.words: Dict[str, bool] = {}
+        self._loaded = False
+        self._modified = False
+
+    def load(self):
+        if os.path.isfile(self.json_path):
+            with open(self.json_path, 'r') as json_file:
+                self.words.update(json.load(json_file))
+        self._loaded = True
+
+    def get(self, word: str, classify: Callable[[str], bool]) -> bool:
+        if not self._loaded:
+            self.load()
+        try:
+            is_real_word = self.words[word]
+            self.hits += 1
+        except KeyError:
+            is_real_word = classify(word)
+            self.words[word] = is_real_word
+            self.misses += 1
+            self._modified = True
+        return is_real_word
+
+    def save(self):
+        """Merged with the words saved meanwhile by other processes"""
+        if not self._modified:
+            return
+        # a concurrent save between the read and the replace would be lost
+        with file_lock(self.json_path):
+            words = {}
+            if os.path.isfile(self.json_path):
+                with open(self.json_path, 'r') as json_file:
+                    words.update(json.load(json_file))
+            words.update(self.words)
+            with atomic_path(self.json_path) as tmp_path:
+                with open(tmp_path, 'w') as json_file:
+                    json.dump(words, json_file, ensure_ascii=False, indent=0,
+                              sort_keys=True)
+        self._modified = False
+
+    def stats(self) -> str:
+        return f'{len(self.words)} words cached, {super().stats()}'
@@ -0,0 +1,442 @@
+"""Storage backends behind the csv_io functions.
+
+All the backends (csv, parquet and normalised) read and write the same frames
+(the CSV schema, i.e. ids and datetimes as strings) so the rest of the code
+does not depend on the backend.
+`filters` follow the pyarrow convention: a list of (column, op, value) tuples
+that must all be true, expressed with the same values as in the frames.
+"""
+import argparse
+import csv
+import hashlib
+import os
+import shutil
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tweet_postprocesser.constants import (ACCOUNTS_TWEET_CSVS,
+                                           POSTPROCESSED_NORMALISED_DIR,
+                                           POSTPROCESSED_PARQUET_DIR,
+                                           POSTPROCESSED_TWEET_CSVS,
+                                           POSTPROCESSED_TWEET_HEADER_DTYPES,
+                                           REFERENCED_TWEETS_CSV,
+                                           REFERENCED_USERS_CSV,
+                                           SCRAPPED_NORMALISED_DIR,
+                                           SCRAPPED_PARQUET_DIR,
+                                           STORAGE_BACKEND,
+                                           TWEET_CSV_HEADER_DTYPES)
+from tweet_scrapper.files import atomic_path, file_lock, to_csv_atomic
+from tweet_scrapper.metrics import METRICS
+
+Filters = List[Tuple[str, str, object]]
+
+INT_COLUMNS = ['id', 'referenced_tweet_id', 'referenced_tweet_author_id']
+DATETIME_COLUMNS = ['datetime', 'referenced_tweet_datetime']
+MONTH_COLUMN = 'month'
+# low cardinality columns, stored as categoricals in the compact frames
+CATEGORICAL_COLUMNS = ['username', 'type']
+
+# columns of the shared tables of NormalisedStorage, the first one is the key:
+# a hash of the other ones, i.e. of a version of the referenced tweet/author
+REFERENCED_TWEET_COLUMNS = ['referenced_tweet_key', 'referenced_tweet_text',
+                            'referenced_tweet_datetime']
+REFERENCED_USER_COLUMNS = ['referenced_user_key',
+                           'referenced_tweet_author_id',
+                           'referenced_tweet_author_name',
+                           'referenced_tweet_author_username']
+
+_OPERATORS = {
+    '==': lambda column, value: column == value,
+    '=': lambda column, value: column == value,
+    '!=': lambda column, value: column != value,
+    '<': lambda column, value: column < value,
+    '<=': lambda column, value: column <= value,
+    '>': lambda column, value: column > value,
+    '>=': lambda column, value: column >= value,
+    'in': lambda column, value: column.isin(value),
+    'not in': lambda column, value: ~column.isin(value),
+}
+
+
+def _to_typed_column(series: pd.Series) -> pd.Series:
+    """Ids to nullable int64 and datetimes to UTC timestamps"""
+    if series.name in INT_COLUMNS:
+        # straight from Python ints: a float64 step would round the ids
+        ids = [pd.NA if pd.isna(value) or value == '' else int(value)
+               for value in series]
+        return pd.Series(pd.array(ids, dtype='Int64'),
+                         index=series.index, name=series.name)
+    if series.name in DATETIME_COLUMNS:
+        return pd.to_datetime(series.replace('', np.nan), utc=True)
+    return series
+
+
+def _to_string_column(series: pd.Series) -> pd.Series:
+    """Inverse of _to_typed_column, missing values become NaN like in the
+    frames read from the CSVs"""
+    return (series.astype(object)
+            .where(series.notna())
+            .map(str, na_action='ignore'))
+
+
+def to_compact_frame(df: pd.DataFrame,
+                     pyarrow_strings: bool = False) -> pd.DataFrame:
+    """Compact version of a frame of the CSV schema: int64 ids (nullable for
+    the referenced ones), UTC datetimes, categorical username and type, and
+    the other string columns backed by pyarrow if `pyarrow_strings`"""
+    compact_columns = {}
+    for column in df.columns:
+        series = df[column]
+        if column == 'id' and series.notna().all():
+            compact_columns[column] = series.astype('int64')
+        elif column in INT_COLUMNS + DATETIME_COLUMNS:
+            compact_columns[column] = _to_typed_column(series)
+        elif column in CATEGORICAL_COLUMNS:
+            compact_columns[column] = series.astype('category')
+        elif pyarrow_strings and series.dtype == object:
+            compact_columns[column] = series.astype('string[pyarrow]')
+    return df.assign(**compact_columns)
+
+
+def _to_typed_value(column: str, value):
+    if isinstance(value, (list, tuple, set)):
+        return [_to_typed_value(column, v) for v in value]
+    if column in INT_COLUMNS:
+        return int(value)
+    if column in DATETIME_COLUMNS:
+        timestamp = pd.Timestamp(value)
+        if timestamp.tzinfo is None:
+            return timestamp.tz_localize('UTC')
+        return timestamp.tz_convert('UTC')
+    return value
+
+
+def _apply_filters(df: pd.DataFrame,
+                   filters: Optional[Filters]) -> pd.DataFrame:
+    if not filters:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters:
+        typed_column = _to_typed_column(df[column])
+        mask &= _OPERATORS[op](typed_column,
+                               _to_typed_value(column, value)).fillna(False)
+    return df[mask]
+
+
+def _filter_columns(filters: Optional[Filters]) -> List[str]:
+    return [column for column, _, _ in filters or []]
+
+
+class _Storage:
+
+    def __init__(self, usernames: Iterable[str], dtypes: Dict[str, type]):
+        self.usernames = sorted(usernames)
+        self.dtypes = dtypes
+        self._usernames = set(self.usernames)
+
+    def has_account(self, username: str) -> bool:
+        return username in self._usernames
+
+
+class CsvStorage(_Storage):
+    """One QUOTE_NONNUMERIC CSV per account"""
+
+    def __init__(self, paths: Dict[str, str], dtypes: Dict[str, type]):
+        super().__init__(paths, dtypes)
+        self.paths = paths
+        # root directory of the CSVs, e.g. tweets or postprocessed_tweets
+        self.dataset = os.path.basename(
+            os.path.commonpath(list(paths.values()))) if paths else ''
+
+    def exists(self, username: str) -> bool:
+        return os.path.isfile(self.paths[username])
+
+    def read(self, username: str,
+             columns: Optional[List[str]] = None,
+             filters: Optional[Filters] = None) -> pd.DataFrame:
+        usecols = None
+        if columns:
+            usecols = list(dict.fromkeys(columns + _filter_columns(filters)))
+        df = pd.read_csv(self.paths[username],
+                         header=0,
+                         usecols=usecols,
+                         dtype=self.dtypes)
+        METRICS.inc('csv_bytes_read', os.path.getsize(self.paths[username]),
+                    candidate=username, dataset=self.dataset)
+        df = _apply_filters(df, filters)
+        return df[columns] if columns else df
+
+    def write(self, df: pd.DataFrame, username: str):
+        os.makedirs(os.path.dirname(self.paths[username]), exist_ok=True)
+        to_csv_atomic(df, self.paths[username],
+                      index=False,
+                      quoting=csv.QUOTE_NONNUMERIC)
+        METRICS.inc('csv_bytes_written', os.path.getsize(self.paths[username]),
+                    candidate=username, dataset=self.dataset)
+
+
+class ParquetStorage(_Storage):
+    """Parquet dataset partitioned by candidate and by month, with typed ids
+    and datetimes. Only the requested columns and the partitions/row groups
+    matching the filters are read.
+    """
+
+    def __init__(self, root_dir: str, usernames: Iterable[str],
+                 dtypes: Dict[str, type]):
+        super().__init__(usernames, dtypes)
+        self.root_dir = root_dir
+
+    def _candidate_dir(self, username: str) -> str:
+        return os.path.join(self.root_dir, f'username={username}')
+
+    def exists(self, username: str) -> bool:
+        return os.path.isdir(self._candidate_dir(username))
+
+    @staticmethod
+    def _to_pyarrow_filters(username: str,
+                            filters: Optional[Filters]) -> Filters:
+        pyarrow_filters = [('username', '==', username)]
+        for column, op, value in filters or []:
+            typed_value = _to_typed_value(column, value)
+            pyarrow_filters.append((column, op, typed_value))
+            # prune the month partitions as well
+            if column == 'datetime' and op in ('==', '=', '<', '<=',
+                                               '>', '>='):
+                month = typed_value.strftime('%Y-%m')
+                month_op = {'<': '<=', '>': '>=', '=': '=='}.get(op, op)
+                pyarrow_filters.append((MONTH_COLUMN, month_op, month))
+        return pyarrow_filters
+
+    def read(self, username: str,
+             columns: Optional[List[str]] = None,
+             filters: Optional[Filters] = None) -> pd.DataFrame:
+        df = pd.read_parquet(
+            self.root_dir,
+            engine='pyarrow',
+            columns=(list(dict.fromkeys(columns + ['datetime']))
+                     if columns else None),
+            filters=self._to_pyarrow_filters(username, filters))
+        # partitions are read in ascending month order
+        df = df.sort_values(by='datetime', ascending=False, kind='stable')
+        df = df.reset_index(drop=True)
+        if 'username' in df.columns:
+            df['username'] = df['username'].astype(str)
+        for column in INT_COLUMNS + DATETIME_COLUMNS:
+            if column in df.columns:
+                df[column] = _to_string_column(df[column])
+        header = [column for column in self.dtypes if column in df.columns]
+        return df[columns] if columns else df[header]
+
+    def write(self, df: pd.DataFrame, username: str):
+        typed_df = df.apply(_to_typed_column)
+        typed_df[MONTH_COLUMN] = typed_df['datetime'].dt.strftime('%Y-%m')
+        candidate_dir = self._candidate_dir(username)
+        if os.path.isdir(candidate_dir):
+            shutil.rmtree(candidate_dir)
+        typed_df.to_parquet(self.root_dir,
+                            engine='pyarrow',
+                            index=False,
+                            partition_cols=['username', MONTH_COLUMN])
+
+
+_SHARED_TABLES_LOCK = threading.Lock()
+# path: ((inode, mtime, size), frame)
+_SHARED_TABLES: Dict[str, Tuple[Tuple[int, int, int], pd.DataFrame]] = {}
+
+
+def _read_shared_table(path: str, columns: List[str]) -> pd.DataFrame:
+    """Read once per process, and again only if the file changed"""
+    if not os.path.isfile(path):
+        return pd.DataFrame(columns=columns, dtype=str)
+    stat = os.stat(path)
+    # replaced by the other processes, see _append_shared_table
+    version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    cached = _SHARED_TABLES.get(path)
+    if cached is None or cached[0] != version:
+        df = pd.read_csv(path, header=0, dtype=str)
+        METRICS.inc('csv_bytes_read', os.path.getsize(path),
+                    dataset=os.path.basename(path))
+        cached = _SHARED_TABLES[path] = (version, df)
+    return cached[1]
+
+
+def _version_keys(df: pd.DataFrame, columns: List[str]) -> pd.Series:
+    """Hash of the values of `columns` in each row, missing if they are all
+    missing. Empty strings and NaN are the same value, as in the CSVs."""
+    values = df[columns].replace('', np.nan)
+    present = values.notna().any(axis=1)
+    values = values.fillna('').astype(str)
+    # str.cat instead of a join per row
+    joined = values[columns[0]].str.cat(values[columns[1:]], sep='\x1f')
+    keys = joined.map(lambda value: hashlib.sha1(value.encode())
+                      .hexdigest()[:20])
+    return keys.where(present)
+
+
+def _append_shared_table(path: str, df: pd.DataFrame, columns: List[str]):
+    """Appends the rows whose key is not in the table yet. Keyed by version:
+    the texts and the names of the authors change, every version is kept."""
+    key = columns[0]
+    rows = df.loc[df[key].notna(), columns]
+    rows = rows.drop_duplicates(subset=key)
+    new_rows = rows[~rows[key].isin(_read_shared_table(path, columns)[key])]
+    if new_rows.empty:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # appended to a copy: an interrupted append would leave a torn row
+    with atomic_path(path) as tmp_path:
+        if os.path.isfile(path):
+            shutil.copyfile(path, tmp_path)
+        new_rows.to_csv(tmp_path,
+                        mode='a',
+                        header=not os.path.isfile(path),
+                        index=False,
+                        quoting=csv.QUOTE_NONNUMERIC)
+
+
+class NormalisedStorage(_Storage):
+    """Slim CSV per candidate, without the referenced tweets and their
+    authors: every version of them is stored once in CSVs shared by all the
+    candidates and both datasets, referenced by the keys of the slim rows,
+    and joined back by `read` to return the same frames as CsvStorage. Only
+    the joins needed by the requested columns are done.
+    """
+
+    def __init__(self, root_dir: str, usernames: Iterable[str],
+                 dtypes: Dict[str, type]):
+        super().__init__(usernames, dtypes)
+        self.root_dir = root_dir
+        shared_columns = set(REFERENCED_TWEET_COLUMNS[1:]
+                             + REFERENCED_USER_COLUMNS[1:])
+        self.slim_columns = [column for column in dtypes
+                             if column not in shared_columns]
+
+    def _path(self, username: str) -> str:
+        return os.path.join(self.root_dir, f'{username}.csv')
+
+    def exists(self, username: str) -> bool:
+        return os.path.isfile(self._path(username))
+
+    def read(self, username: str,
+             columns: Optional[List[str]] = None,
+             filters: Optional[Filters] = None) -> pd.DataFrame:
+        needed = list(dict.fromkeys((columns or list(self.dtypes))
+                                    + _filter_columns(filters)))
+        join_tweets = any(column in REFERENCED_TWEET_COLUMNS[1:]
+                          for column in needed)
+        join_users = any(column in REFERENCED_USER_COLUMNS[1:]
+                         for column in needed)
+        usecols = [column for column in self.slim_columns if column in needed]
+        keys = ([REFERENCED_TWEET_COLUMNS[0]] if join_tweets else []) + (
+            [REFERENCED_USER_COLUMNS[0]] if join_users else [])
+        df = pd.read_csv(self._path(username),
+                         header=0,
+                         usecols=usecols + keys,
+                         dtype={**{column: self.dtypes[column]
+                                   for column in usecols},
+                                **{key: str for key in keys}})
+        METRICS.inc('csv_bytes_read', os.path.getsize(self._path(username)),
+                    candidate=username,
+                    dataset=os.path.basename(self.root_dir))
+        with _SHARED_TABLES_LOCK:
+            if join_tweets:
+                df = df.merge(_read_shared_table(REFERENCED_TWEETS_CSV,
+                                                 REFERENCED_TWEET_COLUMNS),
+                              on=REFERENCED_TWEET_COLUMNS[0], how='left')
+            if join_users:
+                df = df.merge(_read_shared_table(REFERENCED_USERS_CSV,
+                                                 REFERENCED_USER_COLUMNS),
+                              on=REFERENCED_USER_COLUMNS[0], how='left')
+        df = _apply_filters(df, filters)
+        if columns:
+            return df[columns]
+        return df[[column for column in self.dtypes if column in df.columns]]
+
+    def write(self, df: pd.DataFrame, username: str):
+        # the pipeline workers write the shared tables concurrently: each
+        # read-append-replace must see the rows of the others
+        df = df.assign(**{
+            columns[0]: _version_keys(df, columns[1:])
+            for columns in (REFERENCED_TWEET_COLUMNS, REFERENCED_USER_COLUMNS)
+        })
+        with _SHARED_TABLES_LOCK, file_lock(REFERENCED_TWEETS_CSV):
+            _append_shared_table(REFERENCED_TWEETS_CSV, df,
+                                 REFERENCED_TWEET_COLUMNS)
+            _append_shared_table(REFERENCED_USERS_CSV, df,
+                                 REFERENCED_USER_COLUMNS)
+        os.makedirs(self.root_dir, exist_ok=True)
+        slim_columns = [column for column in df.columns
+                        if column in self.slim_columns
+                        or column not in self.dtypes]
+        to_csv_atomic(df[slim_columns], self._path(username),
+                      index=False,
+                      quoting=csv.QUOTE_NONNUMERIC)
+        METRICS.inc('csv_bytes_written', os.path.getsize(self._path(username)),
+                    candidate=username,
+                    dataset=os.path.basename(self.root_dir))
+
+
+@lru_cache(maxsize=None)
+def get_scrapped_storage(backend: Optional[str] = None):
+    """Built once per backend. CSV unless another backend is given: the
+    scraper only writes CSVs, TWEETS_STORAGE_BACKEND would read a stale
+    conversion of them"""
+    backend = backend or 'csv'
+    if backend == 'csv':
+        return CsvStorage(ACCOUNTS_TWEET_CSVS, TWEET_CSV_HEADER_DTYPES)
+    elif backend == 'parquet':
+        return ParquetStorage(SCRAPPED_PARQUET_DIR,
+                              ACCOUNTS_TWEET_CSVS,
+                              TWEET_CSV_HEADER_DTYPES)
+    elif backend == 'normalised':
+        return NormalisedStorage(SCRAPPED_NORMALISED_DIR,
+                                 ACCOUNTS_TWEET_CSVS,
+                                 TWEET_CSV_HEADER_DTYPES)
+    raise ValueError(backend)
+
+
+@lru_cache(maxsize=None)
+def get_postprocessed_storage(backend: Optional[str] = None):
+    """Built once per backend"""
+    backend = backend or STORAGE_BACKEND
+    if backend == 'csv':
+        return CsvStorage(POSTPROCESSED_TWEET_CSVS,
+                          POSTPROCESSED_TWEET_HEADER_DTYPES)
+    elif backend == 'parquet':
+        return ParquetStorage(POSTPROCESSED_PARQUET_DIR,
+                              POSTPROCESSED_TWEET_CSVS,
+                              POSTPROCESSED_TWEET_HEADER_DTYPES)
+    elif backend == 'normalised':
+        return NormalisedStorage(POSTPROCESSED_NORMALISED_DIR,
+                                 POSTPROCESSED_TWEET_CSVS,
+                                 POSTPROCESSED_TWEET_HEADER_DTYPES)
+    raise ValueError(backend)
+
+
+def convert_csvs(backend: str):
+    """One-shot conversion of the existing CSVs to another backend"""
+    for get_storage in (get_scrapped_storage, get_postprocessed_storage):
+        csv_storage = get_storage('csv')
+        storage = get_storage(backend)
+        for username in csv_storage.usernames:
+            if not csv_storage.exists(username):
+                continue
+            print(f'converting {csv_storage.paths[username]}')
+            storage.write(csv_storage.read(username), username)
+
+
+def convert_csvs_to_parquet():
+    """One-shot conversion of the existing CSVs to the Parquet datasets"""
+    convert_csvs('parquet')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Converts the CSVs to another storage backend')
+    parser.add_argument('backend', nargs='?', default='parquet',
+                        choices=['parquet', 'normalised'])
+    convert_csvs(parser.parse_args().backend)
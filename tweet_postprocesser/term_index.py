@@ -0,0 +1,409 @@
+"""Inverted index of the cleaned_text column, persisted in a SQLite file:
+term -> tweets (with their candidate and day) and number of occurrences.
+
+Also materialises the term counts per candidate and per day, so that trends
+(rolling windows, top terms) cost the size of the aggregate rather than a scan
+of the tweets.
+
+Kept up to date by do_post_processing, only the tweets whose cleaned_text is
+new or changed are (re)indexed. Built from the postprocessed CSVs and queried
+from the command line, without loading the DataFrames:
+
+    python -m tweet_postprocesser.term_index build
+    python -m tweet_postprocesser.term_index query retraites --since 2022-01-01
+    python -m tweet_postprocesser.term_index top --k 20 --since 2022-03-01
+"""
+import argparse
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import pandas as pd
+
+from tweet_postprocesser.constants import (POSTPROCESSED_TWEET_CSVS,
+                                           TERM_INDEX_FILE)
+from tweet_postprocesser.csv_io import read_postprocessed_csv
+from tweet_scrapper.caches import select_in
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS candidates ('
+    'candidate_id INTEGER PRIMARY KEY, '
+    'username TEXT NOT NULL UNIQUE)',
+    'CREATE TABLE IF NOT EXISTS terms ('
+    'term_id INTEGER PRIMARY KEY, '
+    'term TEXT NOT NULL UNIQUE)',
+    # text_hash: crc32 of the indexed cleaned_text
+    'CREATE TABLE IF NOT EXISTS docs ('
+    'tweet_id INTEGER PRIMARY KEY, '
+    'candidate_id INTEGER NOT NULL, '
+    'day INTEGER NOT NULL, '
+    'text_hash INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS docs_candidate ON docs (candidate_id)',
+    # clustered by term: a query only reads the postings of its term
+    'CREATE TABLE IF NOT EXISTS postings ('
+    'term_id INTEGER NOT NULL, '
+    'tweet_id INTEGER NOT NULL, '
+    'count INTEGER NOT NULL, '
+    'PRIMARY KEY (term_id, tweet_id)) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS postings_tweet ON postings (tweet_id)',
+]
+
+# occurrences of a term and number of tweets using it, per candidate and day
+_DAY_COUNTS_SCHEMA = [
+    'CREATE TABLE day_term_counts ('
+    'candidate_id INTEGER NOT NULL, '
+    'day INTEGER NOT NULL, '
+    'term_id INTEGER NOT NULL, '
+    'count INTEGER NOT NULL, '
+    'n_tweets INTEGER NOT NULL, '
+    'PRIMARY KEY (candidate_id, day, term_id)) WITHOUT ROWID',
+    'CREATE INDEX day_term_counts_term ON day_term_counts (term_id, day)',
+]
+
+# adds (sign=1) or removes (sign=-1) the postings of a tweet to the counts
+_UPSERT_DAY_COUNTS = (
+    'INSERT INTO day_term_counts '
+    '(candidate_id, day, term_id, count, n_tweets) '
+    'SELECT d.candidate_id, d.day, p.term_id, ? * p.count, ? '
+    'FROM postings p JOIN docs d ON d.tweet_id = p.tweet_id '
+    'WHERE p.tweet_id = ? '
+    'ON CONFLICT (candidate_id, day, term_id) DO UPDATE SET '
+    'count = count + excluded.count, '
+    'n_tweets = n_tweets + excluded.n_tweets')
+
+
+def to_day(datetime_: Union[str, date]) -> int:
+    """Days since 1970-01-01 of a CSV datetime ('2022-04-08 10:59:30+00:00')
+    or a date"""
+    if isinstance(datetime_, str):
+        datetime_ = date.fromisoformat(datetime_[:10])
+    return datetime_.toordinal() - _EPOCH_ORDINAL
+
+
+def from_day(day: int) -> date:
+    return date.fromordinal(day + _EPOCH_ORDINAL)
+
+
+def _text_hash(text: str) -> int:
+    return zlib.crc32(text.encode())
+
+
+def _filter_conditions(candidates: Optional[List[str]] = None,
+                       since: Optional[date] = None,
+                       until: Optional[date] = None,
+                       day_column: str = 'd.day') -> Tuple[List[str], list]:
+    """SQL conditions on the candidate usernames (`c` table) and the day"""
+    conditions, params = [], []
+    if candidates:
+        conditions.append(
+            f"c.username IN ({','.join('?' * len(candidates))})")
+        params.extend(candidates)
+    if since:
+        conditions.append(f'{day_column} >= ?')
+        params.append(to_day(since))
+    if until:
+        conditions.append(f'{day_column} < ?')
+        params.append(to_day(until))
+    return conditions, params
+
+
+class WeeklyTermCount(NamedTuple):
+    candidate: str
+    # monday of the week
+    week: date
+    n_tweets: int
+    n_occurrences: int
+
+
+class TermIndex:
+
+    def __init__(self, db_path: str = TERM_INDEX_FILE):
+        self.db_path = db_path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            # waits for the other postprocessing processes, see pipeline
+            self._connection = sqlite3.connect(self.db_path,
+                                               timeout=60,
+                                               check_same_thread=False)
+            for statement in _SCHEMA:
+                self._connection.execute(statement)
+            has_day_counts = self._connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                "AND name = 'day_term_counts'").fetchone()
+            if not has_day_counts:
+                self._create_day_counts()
+        return self._connection
+
+    def _create_day_counts(self):
+        """Creates the aggregates, from the postings of an index built before
+        they existed"""
+        for statement in _DAY_COUNTS_SCHEMA:
+            self._connection.execute(statement)
+        self._connection.execute(
+            'INSERT INTO day_term_counts '
+            '(candidate_id, day, term_id, count, n_tweets) '
+            'SELECT d.candidate_id, d.day, p.term_id, SUM(p.count), COUNT(*) '
+            'FROM postings p JOIN docs d ON d.tweet_id = p.tweet_id '
+            'GROUP BY d.candidate_id, d.day, p.term_id')
+        self._connection.commit()
+
+    def _candidate_id(self, username: str) -> int:
+        connection = self._connect()
+        connection.execute('INSERT OR IGNORE INTO candidates (username) '
+                           'VALUES (?)', (username,))
+        return connection.execute(
+            'SELECT candidate_id FROM candidates WHERE username = ?',
+            (username,)).fetchone()[0]
+
+    def _term_ids(self, terms: Iterable[str]) -> Dict[str, int]:
+        connection = self._connect()
+        terms = list(set(terms))
+        connection.executemany('INSERT OR IGNORE INTO terms (term) '
+                               'VALUES (?)', [(term,) for term in terms])
+        return dict(select_in(connection,
+                              'SELECT term, term_id FROM terms '
+                              'WHERE term IN ({})', terms))
+
+    def update(self, username: str, df: pd.DataFrame) -> int:
+        """Indexes the postprocessed tweets of a candidate (id, datetime and
+        cleaned_text columns) that are not indexed yet or whose cleaned_text
+        changed. Returns the number of (re)indexed tweets."""
+        df = df.drop_duplicates(subset='id')
+        texts = df['cleaned_text'].fillna('').astype(str)
+        hashes = texts.map(_text_hash)
+        with self._lock:
+            connection = self._connect()
+            candidate_id = self._candidate_id(username)
+            indexed = dict(connection.execute(
+                'SELECT tweet_id, text_hash FROM docs '
+                'WHERE candidate_id = ?', (candidate_id,)))
+            tweet_ids = df['id'].astype('int64')
+            to_index = tweet_ids.map(indexed) != hashes
+            if not to_index.any():
+                return 0
+
+            stale_ids = [int(tweet_id) for tweet_id in tweet_ids[to_index]
+                         if int(tweet_id) in indexed]
+            connection.executemany(_UPSERT_DAY_COUNTS,
+                                   [(-1, -1, tweet_id)
+                                    for tweet_id in stale_ids])
+            connection.executemany('DELETE FROM postings WHERE tweet_id = ?',
+                                   [(tweet_id,) for tweet_id in stale_ids])
+            counts = [Counter(text.split()) for text in texts[to_index]]
+            term_ids = self._term_ids(term for count in counts
+                                      for term in count)
+            connection.executemany(
+                'INSERT OR REPLACE INTO docs '
+                '(tweet_id, candidate_id, day, text_hash) '
+                'VALUES (?, ?, ?, ?)',
+                [(int(tweet_id), candidate_id, to_day(datetime_), text_hash)
+                 for tweet_id, datetime_, text_hash
+                 in zip(tweet_ids[to_index], df.loc[to_index, 'datetime'],
+                        hashes[to_index])])
+            connection.executemany(
+                'INSERT INTO postings (term_id, tweet_id, count) '
+                'VALUES (?, ?, ?)',
+                [(term_ids[term], int(tweet_id), term_count)
+                 for tweet_id, count in zip(tweet_ids[to_index], counts)
+                 for term, term_count in count.items()])
+            connection.executemany(_UPSERT_DAY_COUNTS,
+                                   [(1, 1, int(tweet_id))
+                                    for tweet_id in tweet_ids[to_index]])
+            if stale_ids:
+                connection.execute(
+                    'DELETE FROM day_term_counts WHERE n_tweets <= 0')
+            connection.commit()
+        return int(to_index.sum())
+
+    def weekly_counts(self, term: str,
+                      candidates: Optional[List[str]] = None,
+                      since: Optional[date] = None,
+                      until: Optional[date] = None
+                      ) -> List[WeeklyTermCount]:
+        """Per candidate and per week (starting on monday): number of tweets
+        using the term and its number of occurrences"""
+        conditions, params = _filter_conditions(candidates, since, until)
+        # day 0 is a thursday
+        query = (
+            'SELECT c.username, d.day - (d.day + 3) % 7 AS week, '
+            'SUM(d.n_tweets), SUM(d.count) '
+            'FROM terms t '
+            'JOIN day_term_counts d ON d.term_id = t.term_id '
+            'JOIN candidates c ON c.candidate_id = d.candidate_id '
+            f"WHERE {' AND '.join(['t.term = ?', *conditions])} "
+            'GROUP BY c.username, week '
+            'ORDER BY week, c.username')
+        with self._lock:
+            rows = self._connect().execute(
+                query, [term.lower(), *params]).fetchall()
+        return [WeeklyTermCount(username, from_day(week), n_tweets,
+                                n_occurrences)
+                for username, week, n_tweets, n_occurrences in rows]
+
+    def daily_counts(self, term: str,
+                     candidates: Optional[List[str]] = None,
+                     since: Optional[date] = None,
+                     until: Optional[date] = None) -> pd.DataFrame:
+        """Occurrences of the term per day (index, without missing days) and
+        per candidate (columns)"""
+        conditions, params = _filter_conditions(candidates, since, until)
+        query = (
+            'SELECT c.username, d.day, d.count '
+            'FROM terms t '
+            'JOIN day_term_counts d ON d.term_id = t.term_id '
+            'JOIN candidates c ON c.candidate_id = d.candidate_id '
+            f"WHERE {' AND '.join(['t.term = ?', *conditions])}")
+        with self._lock:
+            rows = self._connect().execute(
+                query, [term.lower(), *params]).fetchall()
+        df = pd.DataFrame(rows, columns=['candidate', 'day', 'count'])
+        df = df.pivot_table(index='day', columns='candidate',
+                            values='count', aggfunc='sum', fill_value=0)
+        if not df.empty:
+            df = df.reindex(range(df.index.min(), df.index.max() + 1),
+                            fill_value=0)
+        df.index = [from_day(day) for day in df.index]
+        return df
+
+    def rolling_counts(self, term: str, window_days: int = 7,
+                       candidates: Optional[List[str]] = None,
+                       since: Optional[date] = None,
+                       until: Optional[date] = None) -> pd.DataFrame:
+        """Occurrences of the term over the `window_days` days ending on each
+        day, per candidate"""
+        # the first windows need the days before `since`
+        window_since = (from_day(to_day(since) - window_days + 1)
+                        if since else None)
+        df = self.daily_counts(term, candidates, window_since, until)
+        df = df.rolling(window_days, min_periods=1).sum().astype(int)
+        return df[df.index >= since] if since else df
+
+    def top_terms(self, k: int = 10,
+                  candidates: Optional[List[str]] = None,
+                  since: Optional[date] = None,
+                  until: Optional[date] = None
+                  ) -> List[Tuple[str, int, int]]:
+        """(term, occurrences, tweets) of the k most used terms"""
+        conditions, params = _filter_conditions(candidates, since, until)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ''
+        query = (
+            'SELECT t.term, SUM(d.count) AS n, SUM(d.n_tweets) '
+            'FROM day_term_counts d '
+            'JOIN candidates c ON c.candidate_id = d.candidate_id '
+            'JOIN terms t ON t.term_id = d.term_id '
+            f'{where}'
+            'GROUP BY d.term_id ORDER BY n DESC LIMIT ?')
+        with self._lock:
+            return self._connect().execute(query, [*params, k]).fetchall()
+
+    def to_sparse_matrix(self, candidate: str,
+                         since: Optional[date] = None,
+                         until: Optional[date] = None):
+        """scipy.sparse CSR matrix of the term counts of a candidate, with a
+        row per day and a column per term id, and the days of the rows.
+        scipy is an optional dependency, only needed here.
+        """
+        from scipy.sparse import csr_matrix
+
+        conditions, params = _filter_conditions([candidate], since, until)
+        query = (
+            'SELECT d.day, d.term_id, d.count FROM day_term_counts d '
+            'JOIN candidates c ON c.candidate_id = d.candidate_id '
+            f"WHERE {' AND '.join(conditions)} ORDER BY d.day")
+        with self._lock:
+            connection = self._connect()
+            rows = connection.execute(query, params).fetchall()
+            n_terms = connection.execute(
+                'SELECT COALESCE(MAX(term_id), 0) + 1 FROM terms'
+            ).fetchone()[0]
+        days = sorted({day for day, _, _ in rows})
+        day_rows = {day: row for row, day in enumerate(days)}
+        matrix = csr_matrix(
+            ([count for _, _, count in rows],
+             ([day_rows[day] for day, _, _ in rows],
+              [term_id for _, term_id, _ in rows])),
+            shape=(len(days), n_terms))
+        return matrix, [from_day(day) for day in days]
+
+    def terms(self) -> Dict[int, str]:
+        """Terms by term id, i.e. by column of to_sparse_matrix"""
+        with self._lock:
+            return dict(self._connect().execute(
+                'SELECT term_id, term FROM terms'))
+
+    def tweet_ids(self, term: str,
+                  candidates: Optional[List[str]] = None) -> List[int]:
+        """Ids of the tweets using the term, most recent first"""
+        conditions, params = _filter_conditions(candidates)
+        query = (
+            'SELECT p.tweet_id FROM terms t '
+            'JOIN postings p ON p.term_id = t.term_id '
+            'JOIN docs d ON d.tweet_id = p.tweet_id '
+            'JOIN candidates c ON c.candidate_id = d.candidate_id '
+            f"WHERE {' AND '.join(['t.term = ?', *conditions])} "
+            'ORDER BY p.tweet_id DESC')
+        with self._lock:
+            return [tweet_id for tweet_id, in self._connect().execute(
+                query, [term.lower(), *params])]
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def build_term_index(term_index: Optional[TermIndex] = None):
+    """(Re)indexes the postprocessed tweets of every candidate"""
+    term_index = term_index or TermIndex()
+    columns = ['id', 'datetime', 'cleaned_text']
+    for username in POSTPROCESSED_TWEET_CSVS:
+        df = read_postprocessed_csv(username, columns)
+        if df is None:
+            continue
+        n_indexed = term_index.update(username, df)
+        print(f'indexed {n_indexed} tweets of {username}')
+
+
+def _print_weekly_counts(counts: List[WeeklyTermCount]):
+    for count in counts:
+        print(f'{count.week.isoformat()}  {count.candidate:<20} '
+              f'{count.n_tweets:>5} tweets  {count.n_occurrences:>5} times')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('build', help='index the postprocessed tweets')
+    query_parser = subparsers.add_parser(
+        'query', help='weekly counts of a term per candidate')
+    query_parser.add_argument('term')
+    query_parser.add_argument('--candidate', action='append',
+                              dest='candidates')
+    query_parser.add_argument('--since', type=date.fromisoformat)
+    query_parser.add_argument('--until', type=date.fromisoformat)
+    top_parser = subparsers.add_parser('top', help='most used terms')
+    top_parser.add_argument('--k', type=int, default=10)
+    top_parser.add_argument('--candidate', action='append',
+                            dest='candidates')
+    top_parser.add_argument('--since', type=date.fromisoformat)
+    top_parser.add_argument('--until', type=date.fromisoformat)
+    args = parser.parse_args()
+    if args.command == 'build':
+        build_term_index()
+    elif args.command == 'query':
+        _print_weekly_counts(TermIndex().weekly_counts(
+            args.term, args.candidates, args.since, args.until))
+    else:
+        for term, n_occurrences, n_tweets in TermIndex().top_terms(
+                args.k, args.candidates, args.since, args.until):
+            print(f'{term:<30} {n_occurrences:>6} times '
+                  f'{n_tweets:>6} tweets')
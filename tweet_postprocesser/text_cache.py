@@ -0,0 +1,149 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, Optional
+
+from tweet_scrapper.caches import CacheStats, select_in
+
+DEFAULT_MAX_ENTRIES = 200_000
+DEFAULT_MAX_PERSISTED_ENTRIES = 2_000_000
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha1(text.encode()).digest()
+
+
+class TextCache(CacheStats):
+    """Results of a text function keyed by the hash of the text, shared by
+    all the candidates of a run.
+    The `max_entries` most recently used results are kept in memory. With a
+    `db_path`, results are also persisted in SQLite between runs (up to
+    `max_persisted_entries`, least recently used evicted first), under
+    `namespace` so that several functions (or versions of the spaCy model)
+    can share the file.
+    """
+
+    def __init__(self, namespace: str,
+                 max_entries: int = DEFAULT_MAX_ENTRIES,
+                 db_path: Optional[str] = None,
+                 max_persisted_entries: int = DEFAULT_MAX_PERSISTED_ENTRIES):
+        super().__init__()
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self.max_persisted_entries = max_persisted_entries
+        self.persisted_hits = 0
+        self._entries: 'OrderedDict[bytes, str]' = OrderedDict()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.db_path,
+                                               timeout=60,
+                                               check_same_thread=False)
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS text_results ('
+                'namespace TEXT NOT NULL, '
+                'key BLOB NOT NULL, '
+                'result TEXT NOT NULL, '
+                'last_used REAL NOT NULL, '
+                'PRIMARY KEY (namespace, key)) WITHOUT ROWID')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS text_results_last_used '
+                'ON text_results (namespace, last_used)')
+        return self._connection
+
+    def _remember(self, key: bytes, result: str):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _get_persisted(self, keys: list) -> Dict[bytes, str]:
+        connection = self._connect()
+        found = dict(select_in(connection,
+                               'SELECT key, result FROM text_results '
+                               'WHERE namespace = ? AND key IN ({})',
+                               keys, parameters=[self.namespace]))
+        now = time.time()
+        connection.executemany(
+            'UPDATE text_results SET last_used = ? '
+            'WHERE namespace = ? AND key = ?',
+            [(now, self.namespace, key) for key in found])
+        connection.commit()
+        return found
+
+    def get_many(self, texts: Iterable[str]) -> Dict[str, str]:
+        """Cached results of the texts, by text. Counted per occurrence: a
+        missing text is a miss the first time and a hit the next ones, as it
+        is only computed once."""
+        occurrences = Counter(texts)
+        keys = {text: text_key(text) for text in occurrences}
+        results, missing = {}, {}
+        with self._lock:
+            for text, key in keys.items():
+                result = self._entries.get(key)
+                if result is None:
+                    missing[key] = text
+                else:
+                    self._entries.move_to_end(key)
+                    results[text] = result
+            self.hits += sum(occurrences[text] for text in results)
+            if missing and self.db_path:
+                persisted = self._get_persisted(list(missing))
+                for key, result in persisted.items():
+                    self._remember(key, result)
+                    results[missing[key]] = result
+                self.persisted_hits += sum(occurrences[missing[key]]
+                                           for key in persisted)
+            missing_texts = [text for text in occurrences
+                             if text not in results]
+            self.misses += len(missing_texts)
+            self.hits += sum(occurrences[text] - 1 for text in missing_texts)
+        return results
+
+    def get(self, text: str) -> Optional[str]:
+        return self.get_many([text]).get(text)
+
+    def put_many(self, results: Dict[str, str]):
+        if not results:
+            return
+        keyed = {text_key(text): result for text, result in results.items()}
+        with self._lock:
+            for key, result in keyed.items():
+                self._remember(key, result)
+            if not self.db_path:
+                return
+            connection = self._connect()
+            now = time.time()
+            connection.executemany(
+                'INSERT OR REPLACE INTO text_results '
+                '(namespace, key, result, last_used) VALUES (?, ?, ?, ?)',
+                [(self.namespace, key, result, now)
+                 for key, result in keyed.items()])
+            n_rows = connection.execute(
+                'SELECT COUNT(*) FROM text_results WHERE namespace = ?',
+                (self.namespace,)).fetchone()[0]
+            if n_rows > self.max_persisted_entries:
+                connection.execute(
+                    'DELETE FROM text_results WHERE namespace = ? AND key IN ('
+                    'SELECT key FROM text_results WHERE namespace = ? '
+                    'ORDER BY last_used LIMIT ?)',
+                    (self.namespace, self.namespace,
+                     n_rows - self.max_persisted_entries))
+            connection.commit()
+
+    def put(self, text: str, result: str):
+        self.put_many({text: result})
+
+    def _hit_counts(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'persisted hits': self.persisted_hits}
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,90 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from tweet_scrapper.constants import ACTIVITY_FILE, CANDIDATES_USERNAMES
+from tweet_scrapper.files import atomic_path
+
+# an account is checked again once it probably has this many new tweets...
+TARGET_NEW_TWEETS = 10
+# ...but not more often than every hour nor less often than every week
+MIN_CHECK_INTERVAL = 60 * 60
+MAX_CHECK_INTERVAL = 7 * 24 * 60 * 60
+# weight of the last check in the tweets per day estimate
+_SMOOTHING = 0.3
+
+_DAY = 24 * 60 * 60
+
+
+class ActivityStore:
+    """Last check and estimated tweets per day of every account, persisted
+    in ACTIVITY_FILE, to only scrap the accounts likely to have new tweets:
+    with thousands of registered accounts, a run scales with the active ones.
+    The candidates are checked on every run.
+    """
+
+    def __init__(self, json_path: str = ACTIVITY_FILE):
+        self.json_path = json_path
+        self._lock = threading.Lock()
+        self.activity: Dict[str, Dict[str, float]] = {}
+        if os.path.isfile(json_path):
+            with open(json_path, 'r') as json_file:
+                self.activity = json.load(json_file)
+
+    def record(self, username: str, n_new_tweets: int,
+               now: Optional[float] = None):
+        """Saved by `save`, once per run rather than once per account"""
+        now = now or time.time()
+        with self._lock:
+            previous = self.activity.get(username)
+            if previous is None:
+                tweets_per_day = None
+            else:
+                elapsed_days = max((now - previous['last_checked']) / _DAY,
+                                   MIN_CHECK_INTERVAL / _DAY)
+                observed = n_new_tweets / elapsed_days
+                estimate = previous.get('tweets_per_day')
+                tweets_per_day = (observed if estimate is None
+                                  else _SMOOTHING * observed
+                                  + (1 - _SMOOTHING) * estimate)
+            self.activity[username] = {'last_checked': now,
+                                       'tweets_per_day': tweets_per_day}
+
+    def next_check(self, username: str) -> float:
+        activity = self.activity.get(username)
+        if activity is None:
+            return 0.
+        tweets_per_day = activity.get('tweets_per_day')
+        if tweets_per_day is None:
+            # checked once: no rate yet
+            interval = MIN_CHECK_INTERVAL
+        elif tweets_per_day <= 0:
+            interval = MAX_CHECK_INTERVAL
+        else:
+            interval = min(max(TARGET_NEW_TWEETS / tweets_per_day * _DAY,
+                               MIN_CHECK_INTERVAL),
+                           MAX_CHECK_INTERVAL)
+        return activity['last_checked'] + interval
+
+    def due_accounts(self, usernames: Iterable[str],
+                     now: Optional[float] = None) -> List[str]:
+        """The candidates, then the other accounts due for a check, the most
+        overdue first"""
+        now = now or time.time()
+        with self._lock:
+            next_checks = {username: self.next_check(username)
+                           for username in usernames}
+        due = [username for username, next_check in next_checks.items()
+               if username in CANDIDATES_USERNAMES or next_check <= now]
+        return sorted(due, key=lambda username: (
+            username not in CANDIDATES_USERNAMES, next_checks[username],
+            username))
+
+    def save(self):
+        with self._lock:
+            with atomic_path(self.json_path) as tmp_path:
+                with open(tmp_path, 'w') as json_file:
+                    json.dump(self.activity, json_file, indent=2,
+                              sort_keys=True)
@@ -3,10 +3,29 @@ import os
 from dotenv import load_dotenv
 from tweepy import Client
 
+from tweet_scrapper.transport import (RecordingClient, ReplayClient,
+                                      SyntheticClient)
+
 load_dotenv()
 
 OAUTH2_BEARER_TOKEN = os.getenv('OAUTH2_BEARER_TOKEN')
 
+# 'live' (default), 'record', 'replay' or 'synthetic',
+# see tweet_scrapper.transport
+TWEETS_TRANSPORT = os.getenv('TWEETS_TRANSPORT', 'live')
+TWEETS_FIXTURES_DIR = os.getenv(
+    'TWEETS_FIXTURES_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                 'data', 'fixtures'))
+
 
 def get_client() -> Client:
-    return Client(OAUTH2_BEARER_TOKEN)
+    if TWEETS_TRANSPORT == 'live':
+        return Client(OAUTH2_BEARER_TOKEN)
+    elif TWEETS_TRANSPORT == 'record':
+        return RecordingClient(TWEETS_FIXTURES_DIR, OAUTH2_BEARER_TOKEN)
+    elif TWEETS_TRANSPORT == 'replay':
+        return ReplayClient(TWEETS_FIXTURES_DIR)
+    elif TWEETS_TRANSPORT == 'synthetic':
+        return SyntheticClient()
+    raise ValueError(TWEETS_TRANSPORT)
@@ -0,0 +1,39 @@
+import sqlite3
+from typing import Dict, Iterator, Sequence
+
+# below SQLITE_MAX_VARIABLE_NUMBER of old SQLite versions
+MAX_QUERY_VALUES = 500
+
+
+def select_in(connection: sqlite3.Connection, query: str,
+              values: Sequence, parameters: Sequence = ()) -> Iterator[tuple]:
+    """Rows of `query` for all the `values`, whose `{}` is replaced by the
+    placeholders of `IN ({})`. Run by chunks of MAX_QUERY_VALUES values,
+    after the other `parameters` of the query."""
+    for i in range(0, len(values), MAX_QUERY_VALUES):
+        chunk = values[i:i + MAX_QUERY_VALUES]
+        placeholders = ','.join('?' * len(chunk))
+        yield from connection.execute(query.format(placeholders),
+                                      [*parameters, *chunk])
+
+
+class CacheStats:
+    """Hits and misses of the lookups of a cache"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def _hit_counts(self) -> Dict[str, int]:
+        """Kinds of hits, all counted in the hit rate"""
+        return {'hits': self.hits}
+
+    def stats(self) -> str:
+        hit_counts = self._hit_counts()
+        n_hits = sum(hit_counts.values())
+        lookups = n_hits + self.misses
+        hit_rate = n_hits / lookups if lookups else 0.
+        counts = ', '.join(f'{count} {kind}'
+                           for kind, count in hit_counts.items())
+        return (f'{counts}, {self.misses} misses '
+                f'({round(100 * hit_rate, 1)}% hits)')
@@ -1,8 +1,8 @@
+import csv
+import hashlib
 import os
 from typing import Set
 
-import pandas as pd
-
 from tweet_scrapper.dates import get_date_now
 
 DATA_DIR = os.path.join(
@@ -11,10 +11,44 @@ DATA_DIR = os.path.join(
 
 CANDIDATES_LIST_CSV = os.path.join(DATA_DIR, 'candidates.csv')
 
+# optional, other accounts to scrap (MPs, ministers, parties...), with at
+# least a twitter_username column like candidates.csv
+ACCOUNTS_LIST_CSV = os.path.join(DATA_DIR, 'accounts.csv')
+
 TWEETS_DIR = os.path.join(DATA_DIR, 'scrapped_tweets')
 
 LAST_UPDATE_FILE = os.path.join(DATA_DIR, 'last_update.txt')
 
+WATERMARKS_FILE = os.path.join(DATA_DIR, 'watermarks.json')
+
+REFERENCE_CACHE_FILE = os.path.join(DATA_DIR, 'reference_cache.sqlite')
+
+USER_IDS_FILE = os.path.join(DATA_DIR, 'user_ids.json')
+
+ACTIVITY_FILE = os.path.join(DATA_DIR, 'activity.json')
+
+TWEET_CSV_HEADER = [
+    'username', 'id', 'datetime', 'type', 'text',
+    'has_referenced_tweet', 'referenced_tweet_found',
+    'referenced_tweet_id', 'referenced_tweet_text',
+    'referenced_tweet_datetime',
+    'referenced_tweet_author_id', 'referenced_tweet_author_name',
+    'referenced_tweet_author_username'
+]
+
+_TWEET_CSV_HEADER_DTYPES = [str, str, str, str, str,
+                            bool, bool,
+                            str, str,
+                            str,
+                            str, str,
+                            str]
+
+if len(TWEET_CSV_HEADER) != len(_TWEET_CSV_HEADER_DTYPES):
+    raise ValueError('tweet headers & types lengths do not match')
+
+TWEET_CSV_HEADER_DTYPES = {col: dtype for (col, dtype)
+                           in zip(TWEET_CSV_HEADER, _TWEET_CSV_HEADER_DTYPES)}
+
 
 def get_last_update_timestamp() -> str:
     with open(LAST_UPDATE_FILE, 'r') as last_update_file:
@@ -30,8 +64,9 @@ def update_last_update_timestamp() -> str:
 
 
 def get_candidate_usernames() -> Set[str]:
-    df = pd.read_csv(CANDIDATES_LIST_CSV, header=0)
-    usernames = set(df.twitter_username)
+    with open(CANDIDATES_LIST_CSV, 'r') as candidates_csv:
+        usernames = {row['twitter_username']
+                     for row in csv.DictReader(candidates_csv)}
     return {username.replace('@', '') for username in usernames}
 
 
@@ -48,3 +83,34 @@ CANDIDATES_TWEET_CSVS = {
     username: get_candidate_tweets_csv(username)
     for username in CANDIDATES_USERNAMES
 }
+
+
+def get_account_usernames() -> Set[str]:
+    """The candidates and the accounts of ACCOUNTS_LIST_CSV"""
+    usernames = set(CANDIDATES_USERNAMES)
+    if os.path.isfile(ACCOUNTS_LIST_CSV):
+        with open(ACCOUNTS_LIST_CSV, 'r') as accounts_csv:
+            usernames.update(row['twitter_username'].replace('@', '')
+                             for row in csv.DictReader(accounts_csv))
+    return usernames
+
+
+ACCOUNTS_USERNAMES = get_account_usernames()
+
+
+def get_account_tweets_csv(username: str,
+                           tweets_dir: str = TWEETS_DIR) -> str:
+    """The candidates keep their CSV at the root of `tweets_dir`, the other
+    accounts are sharded in 256 sub-directories so that no directory gets
+    thousands of files"""
+    username = username.replace('@', '')
+    if username in CANDIDATES_USERNAMES:
+        return os.path.join(tweets_dir, f'{username}.csv')
+    shard = hashlib.sha1(username.lower().encode()).hexdigest()[:2]
+    return os.path.join(tweets_dir, 'accounts', shard, f'{username}.csv')
+
+
+ACCOUNTS_TWEET_CSVS = {
+    username: get_account_tweets_csv(username)
+    for username in ACCOUNTS_USERNAMES
+}
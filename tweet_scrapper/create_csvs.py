@@ -1,42 +1,45 @@
+import argparse
 import csv
 import os
-from typing import List
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Set, Tuple, Union
 
 import pandas as pd
+from tweepy import Client, Tweet
 
-from tweet_scrapper.constants import (CANDIDATES_TWEET_CSVS,
-                                      CANDIDATES_USERNAMES,
-                                      get_last_update_timestamp,
+from tweet_scrapper.activity import ActivityStore
+from tweet_scrapper.auth import get_client
+from tweet_scrapper.constants import (ACCOUNTS_TWEET_CSVS, ACCOUNTS_USERNAMES,
+                                      CANDIDATES_USERNAMES, TWEET_CSV_HEADER,
+                                      TWEET_CSV_HEADER_DTYPES,
                                       update_last_update_timestamp)
-from tweet_scrapper.parse_tweet import (TweetType,
+from tweet_scrapper.files import atomic_path, to_csv_atomic
+from tweet_scrapper.journal import ScrapeJournal
+from tweet_scrapper.metrics import METRICS
+from tweet_scrapper.parse_tweet import (IndexedIncludes, TweetType,
                                         get_referenced_tweet_and_user,
-                                        get_tweet_type)
-from tweet_scrapper.user_tweets import get_candidates_user_ids, get_user_tweets
+                                        get_tweet_type, index_includes)
+from tweet_scrapper.reference_cache import ReferenceCache
+from tweet_scrapper.tweets import get_tweets
+from tweet_scrapper.user_tweets import (DEFAULT_BACKFILL_SLICES,
+                                        PaginationInterrupted,
+                                        get_accounts_user_ids,
+                                        get_all_available_user_tweets_sliced,
+                                        iter_user_tweets_pages)
+from tweet_scrapper.watermarks import WatermarkStore
 
-TWEET_CSV_HEADER = [
-    'username', 'id', 'datetime', 'type', 'text',
-    'has_referenced_tweet', 'referenced_tweet_found',
-    'referenced_tweet_id', 'referenced_tweet_text',
-    'referenced_tweet_datetime',
-    'referenced_tweet_author_id', 'referenced_tweet_author_name',
-    'referenced_tweet_author_username'
-]
+WATERMARKS = WatermarkStore()
 
-_TWEET_CSV_HEADER_DTYPES = [str, str, str, str, str,
-                            bool, bool,
-                            str, str,
-                            str,
-                            str, str,
-                            str]
+ACTIVITY = ActivityStore()
 
-if len(TWEET_CSV_HEADER) != len(_TWEET_CSV_HEADER_DTYPES):
-    raise ValueError('tweet headers & types lengths do not match')
+REFERENCE_CACHE = ReferenceCache()
 
-TWEET_CSV_HEADER_DTYPES = {col: dtype for (col, dtype)
-                           in zip(TWEET_CSV_HEADER, _TWEET_CSV_HEADER_DTYPES)}
+# candidates scrapped concurrently by do_update
+DEFAULT_MAX_WORKERS = 4
 
-
-CANDIDATES_USER_IDS = get_candidates_user_ids()
+# failed resumptions from the same pagination token before a new query
+MAX_FAILED_RESUMES = 3
 
 
 def merge_tweet_dfs(dfs: List[pd.DataFrame]) -> pd.DataFrame:
@@ -48,78 +51,493 @@ def merge_tweet_dfs(dfs: List[pd.DataFrame]) -> pd.DataFrame:
     return filtered
 
 
+def _resolve_missing_references(referenced_tweet_ids: Iterable[int],
+                                includes: IndexedIncludes,
+                                client: Optional[Client] = None,
+                                cache: Optional[ReferenceCache] = None):
+    """Fetches the referenced tweets (and their authors) missing from the
+    includes of the response from the cache, or else in batches of 100 ids"""
+    missing_ids = set()
+    for referenced_tweet_id in referenced_tweet_ids:
+        referenced_tweet = includes.tweets.get(referenced_tweet_id)
+        if (referenced_tweet is None
+                or referenced_tweet.author_id not in includes.users):
+            missing_ids.add(referenced_tweet_id)
+    if not missing_ids:
+        return
+    fetched_tweets, fetched_includes = get_tweets(sorted(missing_ids),
+                                                  client, cache)
+    includes.tweets.update({tweet.id: tweet for tweet in fetched_tweets})
+    includes.users.update({user.id: user
+                           for user in fetched_includes['users']})
+
+
+def _tweets_to_df(username: str,
+                  tweets: List[Tweet],
+                  includes: dict,
+                  client: Optional[Client] = None,
+                  cache: Optional[ReferenceCache] = None) -> pd.DataFrame:
+    tweet_types = [get_tweet_type(tweet) for tweet in tweets]
+    indexed_includes = index_includes(includes)
+    if cache:
+        cache.put_tweets(indexed_includes.tweets.values())
+        cache.put_users(indexed_includes.users.values())
+    _resolve_missing_references(
+        [referenced_tweet_id for _, referenced_tweet_id in tweet_types
+         if referenced_tweet_id],
+        indexed_includes,
+        client,
+        cache)
+
+    data = []
+    for tweet, (tweet_type, referenced_tweet_id) in zip(tweets, tweet_types):
+        referenced_tweet, user = None, None
+        not_found = False
+        if referenced_tweet_id:
+            try:
+                referenced_tweet, user = get_referenced_tweet_and_user(
+                    referenced_tweet_id, indexed_includes)
+            except ValueError:
+                print(f'referenced tweet {referenced_tweet_id} not found '
+                      f'for tweet {tweet.id} ({tweet_type.value}) - '
+                      f'text: {tweet.text}')
+                METRICS.inc('unresolved_references', candidate=username)
+                not_found = True
+        tweet_row = {
+            'username': username,
+            'id': str(tweet.id),
+            'datetime': tweet.created_at,
+            'text': tweet.text,
+            'type': tweet_type.value,
+            'has_referenced_tweet': tweet_type != TweetType.NORMAL,
+            'referenced_tweet_found': (referenced_tweet_id
+                                       and not not_found),
+            'referenced_tweet_id': (str(referenced_tweet.id)
+                                    if referenced_tweet else ''),
+            'referenced_tweet_text': (referenced_tweet.text
+                                      if referenced_tweet else ''),
+            'referenced_tweet_datetime': (referenced_tweet.created_at
+                                          if referenced_tweet else ''),
+            'referenced_tweet_author_id': str(user.id) if user else '',
+            'referenced_tweet_author_name': user.name if user else '',
+            'referenced_tweet_author_username': (user.username
+                                                 if user else ''),
+        }
+        data.append(tweet_row)
+    METRICS.inc('tweets_parsed', len(data), candidate=username)
+    return (pd.DataFrame(data, columns=TWEET_CSV_HEADER)
+            .astype(TWEET_CSV_HEADER_DTYPES, errors='ignore'))
+
+
+def _read_csv_header(csv_path: str) -> str:
+    with open(csv_path, 'r') as csv_file:
+        return csv_file.readline()
+
+
+def _read_csv_index(csv_path: str) -> Tuple[Set[str], Optional[str]]:
+    """Ids and most recent datetime of a tweets CSV, without parsing the
+    other columns"""
+    index_df = pd.read_csv(csv_path,
+                           header=0,
+                           usecols=['id', 'datetime'],
+                           dtype=str)
+    if index_df.empty:
+        return set(), None
+    return set(index_df['id']), index_df['datetime'].max()
+
+
+def _newest_tweet_id(tweet_ids: Iterable[Optional[Union[int, str]]]
+                     ) -> Optional[str]:
+    return max((str(tweet_id) for tweet_id in tweet_ids if tweet_id),
+               key=int, default=None)
+
+
+class StagedTweetsWriter:
+    """Adds freshly fetched tweets to a tweets CSV, page by page.
+    Pages come from the most recent to the oldest tweet and are normally
+    strictly more recent than the tweets of the CSV. So every page is
+    deduplicated against the ids of the CSV and appended to a staging CSV,
+    which `commit` prepends to the CSV without parsing nor rewriting the
+    existing rows. Otherwise, `commit` falls back to a full merge.
+    With the `state` of an interrupted writer (see ScrapeJournal), the
+    staging CSV left by the writer is kept, from where `state` was taken.
+    """
+
+    def __init__(self, csv_path: str, state: Optional[dict] = None):
+        self.csv_path = csv_path
+        self.staging_path = f'{csv_path}.new'
+        self.n_fetched = 0
+        self.n_staged = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.newest_id: Optional[str] = None
+        self._newest_staged_datetime: Optional[str] = None
+        self._oldest_staged_datetime: Optional[str] = None
+        self._is_sorted = True
+        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+        if os.path.isfile(csv_path):
+            self._known_ids, self._last_datetime = _read_csv_index(csv_path)
+            self.bytes_read += os.path.getsize(csv_path)
+        else:
+            self._known_ids, self._last_datetime = set(), None
+        if state:
+            self.n_fetched = state['n_fetched']
+            self.newest_id = state['newest_id']
+        if not (state and self._resume_staging(state)):
+            if os.path.isfile(self.staging_path):
+                os.remove(self.staging_path)
+
+    def _resume_staging(self, state: dict) -> bool:
+        staged_bytes = state['staged_bytes']
+        if (not staged_bytes or not os.path.isfile(self.staging_path)
+                or os.path.getsize(self.staging_path) < staged_bytes):
+            return False
+        # drops the rows staged after the state was taken
+        with open(self.staging_path, 'r+b') as staging_file:
+            staging_file.truncate(staged_bytes)
+        staged_ids, _ = _read_csv_index(self.staging_path)
+        if staged_ids & self._known_ids:
+            # committed, the process died before removing the staging CSV
+            return False
+        self._known_ids.update(staged_ids)
+        self.n_staged = state['n_staged']
+        self._newest_staged_datetime = state['newest_staged_datetime']
+        self._oldest_staged_datetime = state['oldest_staged_datetime']
+        self._is_sorted = state['is_sorted']
+        self.bytes_read += staged_bytes
+        return True
+
+    def state(self) -> dict:
+        """What is needed to resume the writer after its process died"""
+        return {
+            'n_fetched': self.n_fetched,
+            'newest_id': self.newest_id,
+            'n_staged': self.n_staged,
+            'staged_bytes': (os.path.getsize(self.staging_path)
+                             if self.n_staged else 0),
+            'newest_staged_datetime': self._newest_staged_datetime,
+            'oldest_staged_datetime': self._oldest_staged_datetime,
+            'is_sorted': self._is_sorted,
+        }
+
+    def write(self, new_df: pd.DataFrame):
+        if new_df.empty:
+            return
+        self.n_fetched += len(new_df)
+        self.newest_id = _newest_tweet_id([self.newest_id, *new_df['id']])
+
+        new_df = new_df.sort_values(by='datetime', ascending=False)
+        # set lookups: isin would hash all the known ids for every page
+        is_fresh = [tweet_id not in self._known_ids
+                    for tweet_id in new_df['id']]
+        fresh_df = new_df[is_fresh]
+        fresh_df = fresh_df.drop_duplicates(subset='id', keep='first')
+        if len(fresh_df) < len(new_df):
+            print('WARNING - Some duplicates were filtered out')
+        if fresh_df.empty:
+            return
+
+        newest_datetime = fresh_df['datetime'].iloc[0]
+        if ((self._last_datetime is not None
+             and fresh_df['datetime'].iloc[-1] <= self._last_datetime)
+                or (self._oldest_staged_datetime is not None
+                    and newest_datetime > self._oldest_staged_datetime)):
+            self._is_sorted = False
+        if self._newest_staged_datetime is None:
+            self._newest_staged_datetime = newest_datetime
+        self._oldest_staged_datetime = fresh_df['datetime'].iloc[-1]
+
+        staged_size = (os.path.getsize(self.staging_path)
+                       if self.n_staged else 0)
+        fresh_df.to_csv(self.staging_path,
+                        mode='a',
+                        header=self.n_staged == 0,
+                        index=False,
+                        quoting=csv.QUOTE_NONNUMERIC)
+        self.bytes_written += os.path.getsize(self.staging_path) - staged_size
+        self._known_ids.update(fresh_df['id'])
+        self.n_staged += len(fresh_df)
+
+    def _prepend_staged_tweets(self):
+        with atomic_path(self.csv_path) as tmp_path:
+            with open(tmp_path, 'wb') as tmp_file:
+                with open(self.staging_path, 'rb') as staging_file:
+                    shutil.copyfileobj(staging_file, tmp_file)
+                with open(self.csv_path, 'rb') as csv_file:
+                    csv_file.readline()  # header
+                    shutil.copyfileobj(csv_file, tmp_file)
+
+    def commit(self):
+        if not self.n_staged:
+            return
+        self.bytes_read += os.path.getsize(self.staging_path)
+        if os.path.isfile(self.csv_path):
+            self.bytes_read += os.path.getsize(self.csv_path)
+        new_header = ','.join(f'"{col}"' for col in TWEET_CSV_HEADER)
+        if not os.path.isfile(self.csv_path):
+            if self._is_sorted:
+                os.replace(self.staging_path, self.csv_path)
+            else:
+                staged_df = pd.read_csv(self.staging_path,
+                                        header=0,
+                                        dtype=TWEET_CSV_HEADER_DTYPES)
+                to_csv_atomic(merge_tweet_dfs([staged_df]),
+                              self.csv_path,
+                              index=False,
+                              quoting=csv.QUOTE_NONNUMERIC)
+        elif (self._is_sorted
+              and _read_csv_header(self.csv_path).rstrip('\r\n')
+              == new_header):
+            self._prepend_staged_tweets()
+        else:
+            df = pd.read_csv(self.csv_path,
+                             header=0,
+                             dtype=TWEET_CSV_HEADER_DTYPES)
+            staged_df = pd.read_csv(self.staging_path,
+                                    header=0,
+                                    dtype=TWEET_CSV_HEADER_DTYPES)
+            merged_df = merge_tweet_dfs([df, staged_df])
+            to_csv_atomic(merged_df, self.csv_path,
+                          index=False,
+                          quoting=csv.QUOTE_NONNUMERIC)
+        self.bytes_written += os.path.getsize(self.csv_path)
+        if os.path.isfile(self.staging_path):
+            os.remove(self.staging_path)
+        self.n_staged = 0
+        self._last_datetime = max(
+            filter(None, [self._last_datetime, self._newest_staged_datetime]))
+        self._newest_staged_datetime = None
+        self._oldest_staged_datetime = None
+        self._is_sorted = True
+
+
+def write_new_tweets(new_df: pd.DataFrame, csv_path: str):
+    """Adds freshly fetched tweets to a tweets CSV, see StagedTweetsWriter"""
+    writer = StagedTweetsWriter(csv_path)
+    writer.write(new_df)
+    writer.commit()
+
+
+def _commit_writer(username: str, writer: StagedTweetsWriter):
+    with METRICS.timer('csv_commit', candidate=username):
+        writer.commit()
+    METRICS.inc('csv_bytes_read', writer.bytes_read, candidate=username)
+    METRICS.inc('csv_bytes_written', writer.bytes_written,
+                candidate=username)
+    writer.bytes_read, writer.bytes_written = 0, 0
+
+
+def _get_user_id(username: str, client: Client) -> int:
+    user_id = get_accounts_user_ids([username], client)[username]
+    if user_id is None:
+        raise ValueError(f'unknown account {username}')
+    return user_id
+
+
 def update_candidate_csv(username: str,
-                         last_update_timestamp: str):
-    user_id = CANDIDATES_USER_IDS[username]
+                         client: Optional[Client] = None):
+    """Fetches the tweets more recent than the since_id watermark of the
+    candidate page by page, and only moves the watermark once they are all
+    written. Every staged page is recorded in the ScrapeJournal of the
+    account: an interrupted pagination, or a scraping whose process died, is
+    resumed by the next call from its pagination token, without fetching
+    the pages again. A token failing MAX_FAILED_RESUMES times in a row is
+    dropped for a new query from the since_id."""
+    client = client or get_client()
+    user_id = _get_user_id(username, client)
+    csv_path = ACCOUNTS_TWEET_CSVS[username]
 
-    if os.path.isfile(CANDIDATES_TWEET_CSVS[username]):
-        df = pd.read_csv(CANDIDATES_TWEET_CSVS[username],
-                         header=0,
-                         dtype=TWEET_CSV_HEADER_DTYPES)
+    journal = ScrapeJournal(csv_path)
+    progress = journal.load()
+    if progress is None:
+        watermark = WATERMARKS.get(username)
+        since_id = watermark.get('since_id')
+        if not watermark and os.path.isfile(csv_path):
+            # CSV scrapped before the watermarks existed
+            since_id = _newest_tweet_id(_read_csv_index(csv_path)[0])
+        progress = {'since_id': since_id,
+                    'next_token': None,
+                    'complete': False,
+                    'n_pages': 0,
+                    'n_failed_resumes': 0,
+                    'writer': None}
     else:
-        df = pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype
-                           in TWEET_CSV_HEADER_DTYPES.items()})
-        last_update_timestamp = None
-
-    tweets, includes = get_user_tweets(user_id,
-                                       after_date=last_update_timestamp)
-    print(f'fetched {len(tweets)} new tweets')
-
-    if tweets:
-        data = []
-        for tweet in tweets:
-            tweet_type, referenced_tweet_id = get_tweet_type(tweet)
-            referenced_tweet, user = None, None
-            not_found = False
-            if referenced_tweet_id:
-                try:
-                    referenced_tweet, user = get_referenced_tweet_and_user(
-                        referenced_tweet_id, includes)
-                except ValueError:
-                    print(f'referenced tweet {referenced_tweet_id} not found '
-                          f'for tweet {tweet.id} ({tweet_type.value}) - '
-                          f'text: {tweet.text}')
-                    not_found = True
-            tweet_row = {
-                'username': username,
-                'id': str(tweet.id),
-                'datetime': tweet.created_at,
-                'text': tweet.text,
-                'type': tweet_type.value,
-                'has_referenced_tweet': tweet_type != TweetType.NORMAL,
-                'referenced_tweet_found': (referenced_tweet_id
-                                           and not not_found),
-                'referenced_tweet_id': (str(referenced_tweet.id)
-                                        if referenced_tweet else ''),
-                'referenced_tweet_text': (referenced_tweet.text
-                                          if referenced_tweet else ''),
-                'referenced_tweet_datetime': (referenced_tweet.created_at
-                                              if referenced_tweet else ''),
-                'referenced_tweet_author_id': str(user.id) if user else '',
-                'referenced_tweet_author_name': user.name if user else '',
-                'referenced_tweet_author_username': (user.username
-                                                     if user else ''),
-            }
-            data.append(tweet_row)
-        new_df = pd.DataFrame(data).astype(TWEET_CSV_HEADER_DTYPES,
-                                           errors='ignore')
-
-        merged_df = merge_tweet_dfs([df, new_df])
-
-        merged_df.to_csv(CANDIDATES_TWEET_CSVS[username],
-                         index=False,
-                         quoting=csv.QUOTE_NONNUMERIC)
-
-
-def do_update():
-    last_update_timestamp = get_last_update_timestamp()
-    print(last_update_timestamp)
-    for username in CANDIDATES_USERNAMES:
+        print(f'resuming the scraping of {username} after '
+              f'{progress["n_pages"]} pages')
+    since_id = progress['since_id']
+    resume_token = progress['next_token']
+    n_pages = progress['n_pages']
+
+    writer = StagedTweetsWriter(csv_path, state=progress['writer'])
+    if not progress['complete']:
+        pages = iter_user_tweets_pages(
+            user_id,
+            after_tweet_id=since_id,
+            pagination_token=resume_token,
+            client=client)
+        try:
+            for page in pages:
+                METRICS.inc('api_pages', candidate=username)
+                METRICS.inc('tweets_fetched', len(page.tweets),
+                            candidate=username)
+                with METRICS.timer('parse_page', candidate=username):
+                    page_df = _tweets_to_df(username, page.tweets,
+                                            page.includes, client,
+                                            REFERENCE_CACHE)
+                with METRICS.timer('csv_stage', candidate=username):
+                    writer.write(page_df)
+                n_pages += 1
+                journal.save(since_id,
+                             next_token=page.next_token,
+                             complete=page.next_token is None,
+                             n_pages=n_pages,
+                             n_failed_resumes=0,
+                             writer_state=writer.state())
+        except PaginationInterrupted as interruption:
+            METRICS.inc('pagination_interruptions', candidate=username)
+            _commit_writer(username, writer)
+            next_token = interruption.pagination_token
+            n_failed_resumes = 0
+            if next_token and next_token == resume_token:
+                n_failed_resumes = progress['n_failed_resumes'] + 1
+                if n_failed_resumes >= MAX_FAILED_RESUMES:
+                    # expired or invalid token: the tweets already staged
+                    # are filtered out of the new query
+                    print(f'WARNING - dropping the pagination token of '
+                          f'{username}, failed {n_failed_resumes} times')
+                    next_token, n_failed_resumes = None, 0
+            journal.save(since_id,
+                         next_token=next_token,
+                         complete=False,
+                         n_pages=n_pages,
+                         n_failed_resumes=n_failed_resumes,
+                         writer_state=writer.state())
+            raise
+    _commit_writer(username, writer)
+    print(f'fetched {writer.n_fetched} new tweets of {username}')
+    ACTIVITY.record(username, writer.n_fetched)
+
+    WATERMARKS.set(username,
+                   since_id=_newest_tweet_id([writer.newest_id, since_id]))
+    journal.clear()
+
+
+def backfill_candidate_csv(username: str,
+                           n_slices: int = DEFAULT_BACKFILL_SLICES,
+                           client: Optional[Client] = None):
+    """Fetches all the available tweets of the candidate, in `n_slices` id
+    ranges fetched concurrently, and adds the missing ones to the candidate
+    CSV. For new accounts or to rebuild a CSV: nothing is written unless
+    every range was fetched, so the CSV never has holes.
+    """
+    client = client or get_client()
+    user_id = _get_user_id(username, client)
+    with METRICS.timer('backfill', candidate=username):
+        tweets, includes = get_all_available_user_tweets_sliced(
+            user_id, n_slices=n_slices, client=client)
+    METRICS.inc('tweets_fetched', len(tweets), candidate=username)
+
+    writer = StagedTweetsWriter(ACCOUNTS_TWEET_CSVS[username])
+    with METRICS.timer('parse_page', candidate=username):
+        df = _tweets_to_df(username, tweets, includes, client,
+                           REFERENCE_CACHE)
+    writer.write(df)
+    _commit_writer(username, writer)
+    print(f'backfilled {writer.n_fetched} tweets of {username}')
+    since_id = WATERMARKS.get(username).get('since_id')
+    # the pending pagination of an interrupted update is covered as well
+    WATERMARKS.set(username,
+                   since_id=_newest_tweet_id([writer.newest_id, since_id]))
+    ScrapeJournal(ACCOUNTS_TWEET_CSVS[username]).clear()
+
+
+def do_backfill(usernames: Iterable[str],
+                n_slices: int = DEFAULT_BACKFILL_SLICES):
+    """One candidate after the other, each one fetched in parallel slices"""
+    usernames = list(usernames)
+    client = get_client()
+    get_accounts_user_ids(usernames, client)
+    for username in usernames:
+        print(f'backfilling {username}')
+        backfill_candidate_csv(username, n_slices=n_slices, client=client)
+    METRICS.flush(run='backfill')
+
+
+def do_update(max_workers: int = DEFAULT_MAX_WORKERS,
+              usernames: Optional[Iterable[str]] = None,
+              on_updated: Optional[Callable[[str], None]] = None):
+    """Scraps the accounts in parallel threads. They share the same client
+    and the rate limiter of get_users_tweets, and each one only writes its
+    own CSV.
+    By default, the candidates and the other registered accounts due for a
+    check according to their activity (see ActivityStore), and the accounts
+    whose scraping was interrupted (see ScrapeJournal).
+    A failed account doesn't stop the others, and can be retried alone with
+    `usernames`.
+    `on_updated` is called by the scraping thread with the username once an
+    account is successfully updated.
+    """
+    if usernames is None:
+        usernames = ACTIVITY.due_accounts(ACCOUNTS_USERNAMES)
+        # interrupted scrapings are finished whatever the activity
+        due = set(usernames)
+        usernames.extend(
+            username for username in sorted(ACCOUNTS_USERNAMES)
+            if username not in due
+            and ScrapeJournal(ACCOUNTS_TWEET_CSVS[username]).exists())
+        print(f'{len(usernames)} of the {len(ACCOUNTS_USERNAMES)} accounts '
+              f'are due for an update')
+    usernames = list(usernames)
+    client = get_client()
+    # resolved once before the threads start, by chunks of 100
+    get_accounts_user_ids(usernames, client)
+
+    def update(username: str):
         print(f'getting tweets of {username}')
-        update_candidate_csv(username,
-                             last_update_timestamp=last_update_timestamp)
+        with METRICS.timer('update_candidate', candidate=username):
+            update_candidate_csv(username, client=client)
+        if on_updated:
+            on_updated(username)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {username: executor.submit(update, username)
+                   for username in usernames}
+
+    failed_usernames = []
+    for username, future in futures.items():
+        if future.exception():
+            print(f'ERROR - failed to update {username}: '
+                  f'{future.exception()!r}')
+            failed_usernames.append(username)
+            METRICS.inc('failed_updates', candidate=username)
+    ACTIVITY.save()
+    print(f'referenced tweets cache: {REFERENCE_CACHE.stats()}')
+    METRICS.inc('reference_cache_hits', REFERENCE_CACHE.hits)
+    METRICS.inc('reference_cache_misses', REFERENCE_CACHE.misses)
+    METRICS.flush(run='scraping')
+    if failed_usernames:
+        raise RuntimeError(f'failed to update {failed_usernames}')
     update_last_update_timestamp()
 
 
 if __name__ == '__main__':
-    do_update()
+    parser = argparse.ArgumentParser(
+        description='Scraps the new tweets of the accounts')
+    parser.add_argument('usernames', nargs='*',
+                        help='default: the candidates and the accounts due '
+                             'for an update')
+    parser.add_argument('--all', action='store_true',
+                        help='update all the registered accounts')
+    parser.add_argument('--backfill', action='store_true',
+                        help='fetch all the available tweets in parallel '
+                             'id ranges instead of the new ones')
+    parser.add_argument('--slices', type=int,
+                        default=DEFAULT_BACKFILL_SLICES)
+    args = parser.parse_args()
+    if args.backfill:
+        do_backfill(args.usernames or sorted(CANDIDATES_USERNAMES),
+                    n_slices=args.slices)
+    elif args.all:
+        do_update(usernames=sorted(ACCOUNTS_USERNAMES))
+    else:
+        do_update(usernames=args.usernames or None)
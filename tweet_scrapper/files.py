@@ -0,0 +1,40 @@
+import fcntl
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+import pandas as pd
+
+
+@contextmanager
+def atomic_path(path: str) -> Iterator[str]:
+    """Temporary path to write instead of `path`, renamed to `path` once the
+    block succeeds: an interrupted write never leaves a truncated file"""
+    # unique per thread, for the files written concurrently
+    tmp_path = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+
+
+def to_csv_atomic(df: pd.DataFrame, path: str, **kwargs):
+    """df.to_csv(path, **kwargs), written to a temporary file first"""
+    with atomic_path(path) as tmp_path:
+        df.to_csv(tmp_path, **kwargs)
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Exclusive lock on `<path>.lock`, held against the other threads and
+    the other processes, e.g. the postprocessing workers of the pipeline"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,56 @@
+import json
+import os
+from typing import Optional
+
+from tweet_scrapper.files import atomic_path
+
+
+class ScrapeJournal:
+    """Progress of the running scraping of an account, saved next to its CSV
+    (`<csv>.journal`) after every page staged by StagedTweetsWriter:
+    - since_id: since_id of the query, the watermark when the scraping began
+    - next_token: pagination token of the next page to fetch
+    - complete: whether all the pages were fetched
+    - n_pages: number of pages fetched
+    - n_failed_resumes: failed resumptions in a row from next_token
+    - writer: StagedTweetsWriter.state() after the last page, with the size
+      of the staging CSV
+    If the process dies, the next scraping of the account goes on from
+    next_token with the staging CSV truncated to its recorded size: the pages
+    already fetched are neither fetched nor written again. The journal is
+    cleared once the staged tweets are committed and the watermark moved.
+    """
+
+    def __init__(self, csv_path: str):
+        self.path = f'{csv_path}.journal'
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+    def load(self) -> Optional[dict]:
+        if not self.exists():
+            return None
+        with open(self.path, 'r') as json_file:
+            return json.load(json_file)
+
+    def save(self, since_id: Optional[str],
+             next_token: Optional[str],
+             complete: bool,
+             n_pages: int,
+             n_failed_resumes: int,
+             writer_state: dict):
+        journal = {
+            'since_id': since_id,
+            'next_token': next_token,
+            'complete': complete,
+            'n_pages': n_pages,
+            'n_failed_resumes': n_failed_resumes,
+            'writer': writer_state,
+        }
+        with atomic_path(self.path) as tmp_path:
+            with open(tmp_path, 'w') as json_file:
+                json.dump(journal, json_file, indent=2, sort_keys=True)
+
+    def clear(self):
+        if self.exists():
+            os.remove(self.path)
@@ -0,0 +1,208 @@
+"""Per-stage and per-candidate metrics of the scraping and the postprocessing.
+
+Counters (`inc`), gauges (`set_max`) and timers (`timer`, count/sum/max of
+the durations) are kept in memory, labelled by stage and candidate, and
+written by `flush` at the end of a run to the sinks configured by environment
+variables:
+- TWEETS_METRICS_JSONL: JSON lines file, one line per metric and per run
+- TWEETS_METRICS_PROMETHEUS: Prometheus textfile (node_exporter textfile
+  collector), overwritten atomically by every flush
+Opt-in profiling of the stages listed in TWEETS_PROFILE_STAGES (comma
+separated stage names, or '*' for all of them):
+- cProfile: one .prof file per profiled stage in TWEETS_PROFILE_DIR
+- tracemalloc if TWEETS_TRACEMALLOC=1: peak traced memory of the stage
+"""
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from tweet_scrapper.files import atomic_path
+
+METRICS_JSONL = os.getenv('TWEETS_METRICS_JSONL')
+METRICS_PROMETHEUS = os.getenv('TWEETS_METRICS_PROMETHEUS')
+PROFILE_STAGES = {stage.strip() for stage
+                  in os.getenv('TWEETS_PROFILE_STAGES', '').split(',')
+                  if stage.strip()}
+PROFILE_DIR = os.getenv('TWEETS_PROFILE_DIR', 'profiles')
+TRACEMALLOC = os.getenv('TWEETS_TRACEMALLOC') == '1'
+
+METRIC_PREFIX = 'tweets_'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()
+                        if value is not None))
+
+
+def _prometheus_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (f'{key}="{value}"'.replace('\n', '\\n')
+               for key, value in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+class Metrics:
+    """Thread-safe registry shared by the scraping threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # cProfile can only profile one stage at a time
+        self._profile_lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.timers: Dict[Tuple[str, Labels], List[float]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_max(self, name: str, value: float, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self.gauges[key] = max(self.gauges.get(key, value), value)
+
+    def observe(self, stage: str, seconds: float, **labels):
+        key = (stage, _labels(labels))
+        with self._lock:
+            count, total, maximum = self.timers.get(key, [0, 0., 0.])
+            self.timers[key] = [count + 1, total + seconds,
+                                max(maximum, seconds)]
+
+    @contextmanager
+    def timer(self, stage: str, **labels) -> Iterator[None]:
+        """Times the block as `stage`, profiled if it is in PROFILE_STAGES"""
+        with self._profiled(stage, **labels):
+            start_time = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.observe(stage, time.perf_counter() - start_time,
+                             **labels)
+
+    @contextmanager
+    def _profiled(self, stage: str, **labels) -> Iterator[None]:
+        if stage not in PROFILE_STAGES and '*' not in PROFILE_STAGES:
+            yield
+            return
+        profiler = None
+        # nested or concurrent stages are not profiled
+        if self._profile_lock.acquire(blocking=False):
+            import cProfile
+            profiler = cProfile.Profile()
+        if TRACEMALLOC:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        try:
+            if profiler:
+                profiler.enable()
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                name = '-'.join([stage, *(value for _, value
+                                          in _labels(labels))])
+                name = re.sub(r'[^\w\-]', '_', name)
+                profiler.dump_stats(os.path.join(
+                    PROFILE_DIR, f'{name}-{int(time.time())}.prof'))
+                self._profile_lock.release()
+            if TRACEMALLOC:
+                # process-wide: includes the allocations of the other threads
+                self.set_max('peak_memory_bytes',
+                             tracemalloc.get_traced_memory()[1] - start_memory,
+                             stage=stage, **labels)
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            values = [*self.counters.items(), *self.gauges.items()]
+            timers = list(self.timers.items())
+        metrics = [{'name': name, 'labels': dict(labels), 'value': value}
+                   for (name, labels), value in values]
+        metrics.extend({'name': f'{stage}_seconds',
+                        'labels': dict(labels),
+                        'count': count,
+                        'sum': total,
+                        'max': maximum}
+                       for (stage, labels), (count, total, maximum)
+                       in timers)
+        return metrics
+
+    def write_jsonl(self, path: str, run: Optional[str] = None):
+        timestamp = time.time()
+        with open(path, 'a') as jsonl_file:
+            for metric in self.snapshot():
+                metric = {'timestamp': timestamp, 'run': run, **metric}
+                jsonl_file.write(json.dumps(metric) + '\n')
+
+    def write_prometheus(self, path: str):
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            timers = sorted(self.timers.items())
+        typed = set()
+        for metrics, metric_type, suffix in ((counters, 'counter', '_total'),
+                                             (gauges, 'gauge', '')):
+            for (name, labels), value in metrics:
+                metric = f'{METRIC_PREFIX}{name}{suffix}'
+                if metric not in typed:
+                    lines.append(f'# TYPE {metric} {metric_type}')
+                    typed.add(metric)
+                lines.append(f'{metric}{_prometheus_labels(labels)} {value}')
+        if timers:
+            metric = f'{METRIC_PREFIX}stage_seconds'
+            lines.append(f'# TYPE {metric} summary')
+        for (stage, labels), (count, total, _) in timers:
+            stage_labels = _prometheus_labels((('stage', stage), *labels))
+            lines.append(f'{metric}_count{stage_labels} {count}')
+            lines.append(f'{metric}_sum{stage_labels} {total}')
+        with atomic_path(path) as tmp_path:
+            with open(tmp_path, 'w') as prometheus_file:
+                prometheus_file.write('\n'.join(lines) + '\n')
+
+    def flush(self, run: Optional[str] = None):
+        """Writes the metrics to the configured sinks"""
+        if METRICS_JSONL:
+            self.write_jsonl(METRICS_JSONL, run)
+        if METRICS_PROMETHEUS:
+            self.write_prometheus(METRICS_PROMETHEUS)
+
+    def state(self) -> Tuple[dict, dict, dict]:
+        """Picklable copy of the metrics, to be merged in the metrics of
+        another process"""
+        with self._lock:
+            return (dict(self.counters), dict(self.gauges),
+                    {key: list(value) for key, value in self.timers.items()})
+
+    def merge(self, state: Tuple[dict, dict, dict]):
+        counters, gauges, timers = state
+        with self._lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, value in gauges.items():
+                self.gauges[key] = max(self.gauges.get(key, value), value)
+            for key, (count, total, maximum) in timers.items():
+                own_count, own_total, own_maximum = self.timers.get(
+                    key, [0, 0., 0.])
+                self.timers[key] = [own_count + count, own_total + total,
+                                    max(own_maximum, maximum)]
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.timers.clear()
+
+
+METRICS = Metrics()
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional, Tuple
+from typing import Dict, NamedTuple, Optional, Tuple, Union
 
 from tweepy import ReferencedTweet, Tweet, User
 
@@ -28,20 +28,30 @@ def get_tweet_type(tweet: Tweet) -> Tuple[TweetType, Optional[int]]:
     return TweetType.NORMAL, None
 
 
-def get_referenced_tweet_and_user(referenced_tweet_id: int,
-                                  includes: dict) -> Tuple[Tweet, User]:
-    referenced_tweet = None
-    for included_tweet in includes['tweets']:
-        if included_tweet.id == referenced_tweet_id:
-            referenced_tweet = included_tweet
-    if not referenced_tweet:
+class IndexedIncludes(NamedTuple):
+    """Includes of a response, indexed by id"""
+    tweets: Dict[int, Tweet]
+    users: Dict[int, User]
+
+
+def index_includes(includes: dict) -> IndexedIncludes:
+    return IndexedIncludes(
+        tweets={tweet.id: tweet for tweet in includes.get('tweets', [])},
+        users={user.id: user for user in includes.get('users', [])})
+
+
+def get_referenced_tweet_and_user(
+        referenced_tweet_id: int,
+        includes: Union[dict, IndexedIncludes]) -> Tuple[Tweet, User]:
+    if not isinstance(includes, IndexedIncludes):
+        includes = index_includes(includes)
+
+    referenced_tweet = includes.tweets.get(referenced_tweet_id)
+    if referenced_tweet is None:
         raise ValueError()
 
-    user = None
-    for included_user in includes['users']:
-        if included_user.id == referenced_tweet.author_id:
-            user = included_user
-    if not user:
+    user = includes.users.get(referenced_tweet.author_id)
+    if user is None:
         raise ValueError()
 
     return referenced_tweet, user
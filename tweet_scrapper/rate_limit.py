@@ -0,0 +1,31 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `capacity` requests per `period`
+    seconds, shared by all the threads querying the same endpoint."""
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        refilled = (now - self._last_refill) * self.rate
+        self._tokens = min(self.capacity, self._tokens + refilled)
+        self._last_refill = now
+
+    def acquire(self):
+        """Blocks until a request can be made"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
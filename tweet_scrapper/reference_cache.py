@@ -0,0 +1,102 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from tweepy import Tweet, User
+
+from tweet_scrapper.caches import CacheStats, select_in
+from tweet_scrapper.constants import REFERENCE_CACHE_FILE
+
+DEFAULT_MAX_ENTRIES = 500_000
+
+_TABLES = ('tweets', 'users')
+
+
+class ReferenceCache(CacheStats):
+    """Referenced tweets and their authors, keyed by id, shared by all the
+    accounts and persisted between runs in a SQLite file.
+    Beyond `max_entries` rows per table, the least recently used ones are
+    evicted.
+    """
+
+    def __init__(self, db_path: str = REFERENCE_CACHE_FILE,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        super().__init__()
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.db_path,
+                                               check_same_thread=False)
+            for table in _TABLES:
+                self._connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS {table} ('
+                    f'id INTEGER PRIMARY KEY, '
+                    f'data TEXT NOT NULL, '
+                    f'last_used REAL NOT NULL)')
+                self._connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS {table}_last_used '
+                    f'ON {table} (last_used)')
+        return self._connection
+
+    def _get(self, table: str, ids: Iterable[int]) -> Dict[int, dict]:
+        ids = list(set(ids))
+        with self._lock:
+            connection = self._connect()
+            rows = select_in(connection,
+                             f'SELECT id, data FROM {table} '
+                             f'WHERE id IN ({{}})', ids)
+            found = {row_id: json.loads(data) for row_id, data in rows}
+            now = time.time()
+            connection.executemany(
+                f'UPDATE {table} SET last_used = ? WHERE id = ?',
+                [(now, row_id) for row_id in found])
+            connection.commit()
+            self.hits += len(found)
+            self.misses += len(ids) - len(found)
+        return found
+
+    def _put(self, table: str, rows: Dict[int, dict]):
+        if not rows:
+            return
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.executemany(
+                f'INSERT OR REPLACE INTO {table} (id, data, last_used) '
+                f'VALUES (?, ?, ?)',
+                [(row_id, json.dumps(data), now)
+                 for row_id, data in rows.items()])
+            n_rows = connection.execute(
+                f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            if n_rows > self.max_entries:
+                connection.execute(
+                    f'DELETE FROM {table} WHERE id IN ('
+                    f'SELECT id FROM {table} ORDER BY last_used LIMIT ?)',
+                    (n_rows - self.max_entries,))
+            connection.commit()
+
+    def get_tweets(self, tweet_ids: Iterable[int]) -> Dict[int, Tweet]:
+        return {tweet_id: Tweet(data) for tweet_id, data
+                in self._get('tweets', tweet_ids).items()}
+
+    def get_users(self, user_ids: Iterable[int]) -> Dict[int, User]:
+        return {user_id: User(data) for user_id, data
+                in self._get('users', user_ids).items()}
+
+    def put_tweets(self, tweets: Iterable[Tweet]):
+        self._put('tweets', {tweet.id: tweet.data for tweet in tweets})
+
+    def put_users(self, users: Iterable[User]):
+        self._put('users', {user.id: user.data for user in users})
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,211 @@
+"""Offline transports for the Twitter API v2.
+
+All of them are tweepy.Client subclasses overriding `Client.request`, the
+single HTTP entry point of tweepy: responses still go through tweepy's own
+parsing, so the rest of the scraper can't tell them from the live API.
+- RecordingClient: live client saving every response as a JSON fixture
+- ReplayClient: serves the recorded fixtures, no network nor bearer token
+- SyntheticClient: generates paginated timelines of arbitrary size
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from tweepy import Client
+
+API_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.000Z'
+
+
+class _FixtureResponse:
+    """What tweepy needs from a requests.Response once the request is done"""
+
+    status_code = 200
+
+    def __init__(self, payload: dict):
+        self._payload = payload
+
+    def json(self) -> dict:
+        return self._payload
+
+
+def _fixture_path(fixtures_dir: str,
+                  method: str,
+                  route: str,
+                  params: Optional[dict]) -> str:
+    key = json.dumps([method, route, sorted((params or {}).items())])
+    return os.path.join(fixtures_dir,
+                        f'{hashlib.sha1(key.encode()).hexdigest()}.json')
+
+
+class RecordingClient(Client):
+
+    def __init__(self, fixtures_dir: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fixtures_dir = fixtures_dir
+        os.makedirs(fixtures_dir, exist_ok=True)
+
+    def request(self, method, route, params=None, **kwargs):
+        response = super().request(method, route, params=params, **kwargs)
+        fixture = {'method': method,
+                   'route': route,
+                   'params': params,
+                   'response': response.json()}
+        path = _fixture_path(self.fixtures_dir, method, route, params)
+        with open(path, 'w') as fixture_file:
+            json.dump(fixture, fixture_file, ensure_ascii=False)
+        return response
+
+
+class ReplayClient(Client):
+
+    def __init__(self, fixtures_dir: str, **kwargs):
+        super().__init__(**kwargs)
+        self.fixtures_dir = fixtures_dir
+
+    def request(self, method, route, params=None, **kwargs):
+        path = _fixture_path(self.fixtures_dir, method, route, params)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(
+                f'no recorded response for {method} {route} {params}')
+        with open(path, 'r') as fixture_file:
+            return _FixtureResponse(json.load(fixture_file)['response'])
+
+
+class SyntheticClient(Client):
+    """Every user has a timeline of `n_tweets` tweets, one per minute before
+    `now`, from the most recent to the oldest. Every few tweets is a retweet,
+    a reply or a quote of a tweet of SYNTHETIC_AUTHOR.
+    Supports since_id/until_id/start_time/end_time and the pagination of
+    get_users_tweets, without the 3200 tweets limit of the real API.
+    """
+
+    SYNTHETIC_AUTHOR = {'id': '42',
+                        'name': 'Synthetic author',
+                        'username': 'synthetic_author'}
+    FIRST_TWEET_ID = 1_500_000_000_000_000_000
+    TWEET_ID_STEP = 1000
+
+    def __init__(self,
+                 n_tweets: int = 3200,
+                 now: datetime = datetime(2022, 4, 10, tzinfo=timezone.utc),
+                 **kwargs):
+        super().__init__(**kwargs)
+        self.n_tweets = n_tweets
+        self.now = now
+        self.requests_count = 0
+
+    @staticmethod
+    def _user_id(username: str) -> int:
+        return int(hashlib.sha1(username.lower().encode()).hexdigest()[:12],
+                   16)
+
+    def _user(self, username: str) -> dict:
+        return {'id': str(self._user_id(username)),
+                'name': username,
+                'username': username}
+
+    def _tweet_id(self, user_id: int, index: int) -> int:
+        return (self.FIRST_TWEET_ID + user_id % (self.TWEET_ID_STEP - 1)
+                - index * self.TWEET_ID_STEP)
+
+    def _created_at(self, index: int) -> datetime:
+        return self.now - timedelta(minutes=index)
+
+    def _index_range(self, user_id: int, params: dict) -> range:
+        start, end = 0, self.n_tweets
+        first_id = self._tweet_id(user_id, 0)
+        step = self.TWEET_ID_STEP
+        if 'since_id' in params:
+            end = min(end, max(0, -(-(first_id - int(params['since_id']))
+                                    // step)))
+        if 'until_id' in params:
+            start = max(start,
+                        (first_id - int(params['until_id'])) // step + 1)
+        if 'start_time' in params:
+            start_time = _parse_api_date(params['start_time'])
+            minutes = (self.now - start_time).total_seconds() // 60
+            end = min(end, max(0, int(minutes) + 1))
+        if 'end_time' in params:
+            end_time = _parse_api_date(params['end_time'])
+            minutes = (self.now - end_time).total_seconds() // 60
+            start = max(start, int(minutes) + 1)
+        if 'pagination_token' in params:
+            start = max(start, int(params['pagination_token']))
+        return range(start, max(start, end))
+
+    def _referenced_tweet(self, tweet_id: int) -> dict:
+        return {'id': str(tweet_id),
+                'text': f'Tweet de référence {tweet_id} #Presidentielle2022',
+                'created_at': self.now.strftime(API_DATE_FORMAT),
+                'author_id': self.SYNTHETIC_AUTHOR['id']}
+
+    def _timeline_tweet(self, user_id: int, index: int) -> dict:
+        tweet_id = self._tweet_id(user_id, index)
+        tweet = {'id': str(tweet_id),
+                 'author_id': str(user_id),
+                 'created_at': self._created_at(index).strftime(
+                     API_DATE_FORMAT),
+                 'text': f'Tweet numéro {index}, votez ! https://t.co/abcdef'}
+        for modulo, reference_type in ((5, 'retweeted'),
+                                       (7, 'replied_to'),
+                                       (11, 'quoted')):
+            if index % modulo == modulo - 1:
+                tweet['referenced_tweets'] = [{'type': reference_type,
+                                               'id': str(tweet_id - 1)}]
+                if reference_type == 'replied_to':
+                    tweet['text'] = (f"@{self.SYNTHETIC_AUTHOR['username']} "
+                                     f"{tweet['text']}")
+                break
+        return tweet
+
+    def _users_tweets(self, user_id: int, params: dict) -> dict:
+        max_results = int(params.get('max_results', 10))
+        indices = self._index_range(user_id, params)
+        page = indices[:max_results]
+        if not page:
+            return {'meta': {'result_count': 0}}
+        tweets = [self._timeline_tweet(user_id, index) for index in page]
+        referenced_tweets = [
+            self._referenced_tweet(int(tweet['referenced_tweets'][0]['id']))
+            for tweet in tweets if 'referenced_tweets' in tweet]
+        meta = {'result_count': len(tweets),
+                'newest_id': tweets[0]['id'],
+                'oldest_id': tweets[-1]['id']}
+        if len(indices) > max_results:
+            meta['next_token'] = str(page[-1] + 1)
+        return {'data': tweets,
+                'includes': {'users': [{'id': str(user_id),
+                                        'name': str(user_id),
+                                        'username': str(user_id)},
+                                       self.SYNTHETIC_AUTHOR],
+                             'tweets': referenced_tweets},
+                'meta': meta}
+
+    def _tweets(self, tweet_ids: List[str]) -> dict:
+        return {'data': [self._referenced_tweet(int(tweet_id))
+                         for tweet_id in tweet_ids],
+                'includes': {'users': [self.SYNTHETIC_AUTHOR]}}
+
+    def request(self, method, route, params=None, **kwargs):
+        self.requests_count += 1
+        params: Dict[str, str] = params or {}
+        parts = route.strip('/').split('/')
+        if parts[:3] == ['2', 'users', 'by'] and len(parts) == 3:
+            payload = {'data': [self._user(username) for username
+                                in params['usernames'].split(',')]}
+        elif parts[:4] == ['2', 'users', 'by', 'username']:
+            payload = {'data': self._user(parts[4])}
+        elif parts[:2] == ['2', 'users'] and parts[3:] == ['tweets']:
+            payload = self._users_tweets(int(parts[2]), params)
+        elif parts == ['2', 'tweets']:
+            payload = self._tweets(params['ids'].split(','))
+        else:
+            raise NotImplementedError(f'{method} {route}')
+        return _FixtureResponse(payload)
+
+
+def _parse_api_date(date: str) -> datetime:
+    return datetime.strptime(date[:19], '%Y-%m-%dT%H:%M:%S').replace(
+        tzinfo=timezone.utc)
@@ -3,6 +3,9 @@ from typing import List, Optional, Tuple, Union
 from tweepy import Client, Response, Tweet
 
 from tweet_scrapper.auth import get_client
+from tweet_scrapper.metrics import METRICS
+from tweet_scrapper.rate_limit import TokenBucket
+from tweet_scrapper.reference_cache import ReferenceCache
 
 # minimal fields in response:
 GET_TWEET_ARGS = dict(
@@ -17,6 +20,9 @@ GET_TWEET_ARGS = dict(
     place_fields=[]
 )
 
+# app-only quota of GET /2/tweets: 300 requests per 15 minutes
+TWEETS_LOOKUP_RATE_LIMITER = TokenBucket(capacity=300, period=15 * 60)
+
 
 def _chunks(lst, n):
     """Yield successive n-sized chunks from lst."""
@@ -34,22 +40,49 @@ def _query_tweets(tweet_ids: List[Union[int, str]],
     if not client:
         client = get_client()
 
-    return client.get_tweets(**args)
+    with METRICS.timer('rate_limit_wait', endpoint='tweets'):
+        TWEETS_LOOKUP_RATE_LIMITER.acquire()
+    with METRICS.timer('api_request', endpoint='tweets'):
+        return client.get_tweets(**args)
 
 
 def get_tweets(tweet_ids: List[Union[int, str]],
-               client: Optional[Client] = None) -> Tuple[List[Tweet], dict]:
-    """Get tweets from list of IDs"""
+               client: Optional[Client] = None,
+               cache: Optional[ReferenceCache] = None
+               ) -> Tuple[List[Tweet], dict]:
+    """Get tweets from list of IDs.
+    The tweets found in the cache with their author are not queried, the
+    queried ones are added to the cache.
+    """
     tweets = []
     includes = {'users': [], 'tweets': []}
-    if not client:
+    if cache:
+        cached_tweets = cache.get_tweets(int(tweet_id)
+                                         for tweet_id in tweet_ids)
+        cached_users = cache.get_users({tweet.author_id for tweet
+                                        in cached_tweets.values()})
+        cached_tweets = {tweet_id: tweet for tweet_id, tweet
+                         in cached_tweets.items()
+                         if tweet.author_id in cached_users}
+        tweets.extend(cached_tweets.values())
+        includes['users'].extend(cached_users.values())
+        tweet_ids = [tweet_id for tweet_id in tweet_ids
+                     if int(tweet_id) not in cached_tweets]
+    if tweet_ids and not client:
         client = get_client()
+    queried = {'users': [], 'tweets': []}
     for chunk_100_tweet_ids in _chunks(tweet_ids, 100):
         response = _query_tweets(chunk_100_tweet_ids, client)
         response_tweets = response.data
         if not response_tweets:
             continue
+        queried['tweets'].extend(response_tweets)
+        queried['tweets'].extend(response.includes.get('tweets', []))
         tweets.extend(response_tweets)
         includes['users'].extend(response.includes.get('users', []))
         includes['tweets'].extend(response.includes.get('tweets', []))
+        queried['users'].extend(response.includes.get('users', []))
+    if cache:
+        cache.put_tweets(queried['tweets'])
+        cache.put_users(queried['users'])
     return tweets, includes
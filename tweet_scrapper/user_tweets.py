@@ -1,11 +1,27 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Iterable, List, Optional, Tuple, Union
+from typing import (Dict, Iterable, Iterator, List, NamedTuple, Optional,
+                    Tuple, Union)
 
 from tweepy import Client, Response, Tweet
 
 from tweet_scrapper.auth import get_client
-from tweet_scrapper.constants import CANDIDATES_USERNAMES
-from tweet_scrapper.tweets import GET_TWEET_ARGS
+from tweet_scrapper.constants import (ACCOUNTS_USERNAMES, CANDIDATES_USERNAMES,
+                                      USER_IDS_FILE)
+from tweet_scrapper.files import atomic_path
+from tweet_scrapper.metrics import METRICS
+from tweet_scrapper.rate_limit import TokenBucket
+from tweet_scrapper.tweets import GET_TWEET_ARGS, _chunks
+
+# app-only quota of GET /2/users/:id/tweets: 1500 requests per 15 minutes
+USER_TWEETS_RATE_LIMITER = TokenBucket(capacity=1500, period=15 * 60)
+
+# the API only gives access to the last 3200 tweets of a user
+MAX_AVAILABLE_TWEETS = 3200
+DEFAULT_BACKFILL_SLICES = 8
 
 
 def _get_user_id(username: str,
@@ -19,21 +35,58 @@ def _get_user_id(username: str,
 
 def _get_user_ids(usernames: Iterable[str],
                   client: Optional[Client] = None) -> Dict[str, int]:
-    """Max 100 usernames in the list"""
+    """Queried by chunks of 100 usernames, the maximum of the API"""
     if not client:
         client = get_client()
+    usernames = list(usernames)
     result = {username: None for username in usernames}
-    response = client.get_users(usernames=list(usernames))
-    for user in response.data:
-        result[user.username] = user.id
+    # the API returns the usernames with their actual case
+    requested = {username.lower(): username for username in usernames}
+    for chunk_100_usernames in _chunks(usernames, 100):
+        response = client.get_users(usernames=chunk_100_usernames)
+        for user in response.data or []:
+            username = requested.get(user.username.lower())
+            if username is not None:
+                result[username] = user.id
     return result
 
 
-def get_candidates_user_ids(client: Optional[Client] = None) -> Dict[str, int]:
+_USER_IDS_LOCK = threading.Lock()
+_USER_IDS: Dict[str, int] = {}
+
+
+def get_accounts_user_ids(usernames: Optional[Iterable[str]] = None,
+                          client: Optional[Client] = None) -> Dict[str, int]:
+    """Ids of the accounts (default: all the registered ones), cached in
+    memory and in USER_IDS_FILE: only the accounts whose id is unknown are
+    queried. None for the accounts that could not be found, which are not
+    cached and queried again by the next call."""
     usernames = [username.replace('@', '')
-                 for username in CANDIDATES_USERNAMES]
-    user_ids = _get_user_ids(usernames, client)
-    return user_ids
+                 for username in (ACCOUNTS_USERNAMES if usernames is None
+                                  else usernames)]
+    with _USER_IDS_LOCK:
+        if not _USER_IDS and os.path.isfile(USER_IDS_FILE):
+            with open(USER_IDS_FILE, 'r') as user_ids_file:
+                _USER_IDS.update({username: user_id for username, user_id
+                                  in json.load(user_ids_file).items()
+                                  if user_id is not None})
+        missing_usernames = [username for username in usernames
+                             if username not in _USER_IDS]
+        if missing_usernames:
+            found_ids = {username: user_id for username, user_id
+                         in _get_user_ids(missing_usernames, client).items()
+                         if user_id is not None}
+            if found_ids:
+                _USER_IDS.update(found_ids)
+                with atomic_path(USER_IDS_FILE) as tmp_path:
+                    with open(tmp_path, 'w') as user_ids_file:
+                        json.dump(_USER_IDS, user_ids_file, indent=2,
+                                  sort_keys=True)
+        return {username: _USER_IDS.get(username) for username in usernames}
+
+
+def get_candidates_user_ids(client: Optional[Client] = None) -> Dict[str, int]:
+    return get_accounts_user_ids(CANDIDATES_USERNAMES, client)
 
 
 def _query_tweets(user_id: Union[int, str],
@@ -64,59 +117,142 @@ def _query_tweets(user_id: Union[int, str],
     if not client:
         client = get_client()
 
-    return client.get_users_tweets(**args)
+    with METRICS.timer('rate_limit_wait', endpoint='users_tweets'):
+        USER_TWEETS_RATE_LIMITER.acquire()
+    with METRICS.timer('api_request', endpoint='users_tweets'):
+        return client.get_users_tweets(**args)
 
 
-def _query_tweets_paginated(
+class PaginationInterrupted(Exception):
+    """A page could not be fetched. Holds the tweets of the previous pages and
+    the token of the failed page, to resume the pagination from there with
+    the same query."""
+
+    def __init__(self, tweets: List[Tweet], includes: dict,
+                 pagination_token: Optional[str]):
+        super().__init__(f'pagination interrupted after {len(tweets)} '
+                         f'tweets (token: {pagination_token})')
+        self.tweets = tweets
+        self.includes = includes
+        self.pagination_token = pagination_token
+
+
+class TweetsPage(NamedTuple):
+    tweets: List[Tweet]
+    includes: dict
+    next_token: Optional[str]
+
+
+def _iter_query_tweets_pages(
         user_id: Union[int, str],
         after_tweet_id: Optional[Union[int, str]] = None,
         after_date: Optional[Union[datetime, str]] = None,
         before_tweet_id: Optional[Union[int, str]] = None,
         before_date: Optional[Union[datetime, str]] = None,
-        client: Optional[Client] = None) -> Tuple[List[Tweet], dict]:
+        pagination_token: Optional[str] = None,
+        client: Optional[Client] = None) -> Iterator[TweetsPage]:
     """Pagination goes from most recent to oldest tweet.
     API only gives access to the last 3200 tweets of the user.
     """
-
-    pagination_token = None
-    tweets = []
-    includes = {'users': [], 'tweets': []}
     while True:
-        response = _query_tweets(
-            user_id,
-            after_tweet_id=after_tweet_id,
-            after_date=after_date,
-            before_tweet_id=before_tweet_id,
-            before_date=before_date,
-            pagination_token=pagination_token,
-            client=client
-        )
+        try:
+            response = _query_tweets(
+                user_id,
+                after_tweet_id=after_tweet_id,
+                after_date=after_date,
+                before_tweet_id=before_tweet_id,
+                before_date=before_date,
+                pagination_token=pagination_token,
+                client=client
+            )
+        except Exception as error:
+            raise PaginationInterrupted([], {'users': [], 'tweets': []},
+                                        pagination_token) from error
         response_tweets = response.data
         if not response_tweets:
             break
-        includes['users'].extend(response.includes.get('users', []))
-        includes['tweets'].extend(response.includes.get('tweets', []))
-        tweets.extend(response_tweets)
         pagination_token = response.meta.get('next_token')
+        yield TweetsPage(
+            tweets=response_tweets,
+            includes={'users': response.includes.get('users', []),
+                      'tweets': response.includes.get('tweets', [])},
+            next_token=pagination_token)
         if not pagination_token:
             break
+
+
+def _query_tweets_paginated(
+        user_id: Union[int, str],
+        after_tweet_id: Optional[Union[int, str]] = None,
+        after_date: Optional[Union[datetime, str]] = None,
+        before_tweet_id: Optional[Union[int, str]] = None,
+        before_date: Optional[Union[datetime, str]] = None,
+        pagination_token: Optional[str] = None,
+        client: Optional[Client] = None) -> Tuple[List[Tweet], dict]:
+    tweets = []
+    includes = {'users': [], 'tweets': []}
+    pages = _iter_query_tweets_pages(
+        user_id,
+        after_tweet_id=after_tweet_id,
+        after_date=after_date,
+        before_tweet_id=before_tweet_id,
+        before_date=before_date,
+        pagination_token=pagination_token,
+        client=client
+    )
+    try:
+        for page in pages:
+            includes['users'].extend(page.includes['users'])
+            includes['tweets'].extend(page.includes['tweets'])
+            tweets.extend(page.tweets)
+    except PaginationInterrupted as interruption:
+        raise PaginationInterrupted(
+            tweets, includes,
+            interruption.pagination_token) from interruption.__cause__
     return tweets, includes
 
 
+def iter_user_tweets_pages(
+        user_id: Union[int, str],
+        after_tweet_id: Optional[Union[int, str]] = None,
+        after_date: Optional[Union[datetime, str]] = None,
+        before_tweet_id: Optional[Union[int, str]] = None,
+        before_date: Optional[Union[datetime, str]] = None,
+        pagination_token: Optional[str] = None,
+        client: Optional[Client] = None) -> Iterator[TweetsPage]:
+    """Same as get_user_tweets, but yields the tweets page by page instead of
+    accumulating the whole timeline"""
+    return _iter_query_tweets_pages(
+        user_id,
+        after_tweet_id=after_tweet_id,
+        after_date=after_date,
+        before_tweet_id=before_tweet_id,
+        before_date=before_date,
+        pagination_token=pagination_token,
+        client=client,
+    )
+
+
 def get_user_tweets(
         user_id: Union[int, str],
         after_tweet_id: Optional[Union[int, str]] = None,
         after_date: Optional[Union[datetime, str]] = None,
         before_tweet_id: Optional[Union[int, str]] = None,
         before_date: Optional[Union[datetime, str]] = None,
+        pagination_token: Optional[str] = None,
         client: Optional[Client] = None) -> Tuple[List[Tweet], dict]:
-    """Gets tweets of a specific user with optional chronological filtering"""
+    """Gets tweets of a specific user with optional chronological filtering.
+    `pagination_token` resumes an interrupted pagination (see
+    PaginationInterrupted), the other arguments must be the same as in the
+    interrupted call.
+    """
     return _query_tweets_paginated(
         user_id,
         after_tweet_id=after_tweet_id,
         after_date=after_date,
         before_tweet_id=before_tweet_id,
         before_date=before_date,
+        pagination_token=pagination_token,
         client=client,
     )
 
@@ -126,3 +262,63 @@ def get_all_available_user_tweets(
         client: Optional[Client] = None) -> Tuple[List[Tweet], dict]:
     """Gets all the available tweets of a user, i.e. the ~3200 latest tweets"""
     return _query_tweets_paginated(user_id, client=client)
+
+
+def _slice_boundaries(newest_id: int, oldest_id: int, n_fetched: int,
+                      n_slices: int) -> List[int]:
+    """Decreasing ids splitting the available tweets older than `oldest_id`
+    in `n_slices` ranges of about the same number of tweets, assuming the
+    user keeps tweeting at the rate of the `n_fetched` most recent tweets.
+    Tweet ids are snowflakes, increasing with time, so splitting ids is
+    splitting time.
+    """
+    n_remaining = max(MAX_AVAILABLE_TWEETS - n_fetched, 0)
+    id_span = (newest_id - oldest_id) * n_remaining / max(n_fetched - 1, 1)
+    step = max(int(id_span // n_slices), 1)
+    # at least 2: boundary - 1 is the since_id of the next slice, and a 0
+    # since_id would be no lower bound at all
+    return [max(oldest_id - i * step, 2) for i in range(n_slices)]
+
+
+def get_all_available_user_tweets_sliced(
+        user_id: Union[int, str],
+        n_slices: int = DEFAULT_BACKFILL_SLICES,
+        client: Optional[Client] = None) -> Tuple[List[Tweet], dict]:
+    """Same tweets as get_all_available_user_tweets, most recent first, but
+    once the first page is fetched, the older tweets are split into id ranges
+    paginated concurrently: slice i has the tweets from boundary i + 1
+    (included) to boundary i (excluded), the last one has no lower bound.
+    """
+    if not client:
+        client = get_client()
+    probe = next(iter_user_tweets_pages(user_id, client=client), None)
+    if probe is None:
+        return [], {'users': [], 'tweets': []}
+    slices = [(probe.tweets, probe.includes)]
+    if probe.next_token:
+        probe_ids = [tweet.id for tweet in probe.tweets]
+        boundaries = _slice_boundaries(max(probe_ids), min(probe_ids),
+                                       len(probe_ids), n_slices)
+
+        def get_slice(i: int) -> Tuple[List[Tweet], dict]:
+            is_last = i == len(boundaries) - 1
+            return _query_tweets_paginated(
+                user_id,
+                after_tweet_id=None if is_last else boundaries[i + 1] - 1,
+                before_tweet_id=boundaries[i],
+                client=client)
+
+        with ThreadPoolExecutor(max_workers=n_slices) as executor:
+            slices.extend(executor.map(get_slice, range(len(boundaries))))
+
+    # same result whatever the order the slices were fetched in
+    tweets_by_id = {}
+    includes = {'users': [], 'tweets': []}
+    for tweets, slice_includes in slices:
+        for tweet in tweets:
+            tweets_by_id.setdefault(tweet.id, tweet)
+        includes['users'].extend(slice_includes['users'])
+        includes['tweets'].extend(slice_includes['tweets'])
+    tweets = [tweets_by_id[tweet_id]
+              for tweet_id in sorted(tweets_by_id, reverse=True)]
+    return tweets, includes
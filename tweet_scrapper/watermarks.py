@@ -0,0 +1,37 @@
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from tweet_scrapper.constants import WATERMARKS_FILE
+from tweet_scrapper.files import atomic_path
+
+
+class WatermarkStore:
+    """Scraping state of every account, persisted in WATERMARKS_FILE:
+    - since_id: id of the newest tweet written in the account CSV
+    The progress of an interrupted scraping is recorded by ScrapeJournal.
+    """
+
+    def __init__(self, json_path: str = WATERMARKS_FILE):
+        self.json_path = json_path
+        self._lock = threading.Lock()
+        self.watermarks: Dict[str, Dict[str, Optional[str]]] = {}
+        if os.path.isfile(json_path):
+            with open(json_path, 'r') as json_file:
+                self.watermarks = json.load(json_file)
+
+    def get(self, username: str) -> Dict[str, Optional[str]]:
+        with self._lock:
+            return dict(self.watermarks.get(username, {}))
+
+    def set(self, username: str, since_id: Optional[str]):
+        with self._lock:
+            self.watermarks[username] = {'since_id': since_id}
+            self._save()
+
+    def _save(self):
+        with atomic_path(self.json_path) as tmp_path:
+            with open(tmp_path, 'w') as json_file:
+                json.dump(self.watermarks, json_file, indent=2,
+                          sort_keys=True)